@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from main.paginators import EstimatedCountPaginator
 from .models import CustomUser, UserActivity
 
 @admin.register(CustomUser)
@@ -9,10 +10,30 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('username',)
 
+class ActionListFilter(admin.SimpleListFilter):
+    # A fixed list instead of list_filter = ('action',), which would run
+    # SELECT DISTINCT over the whole activity table on every page load.
+    title = 'action'
+    parameter_name = 'action'
+
+    def lookups(self, request, model_admin):
+        return [(action, action) for action in UserActivity.ACTIONS] + [('updated_by_admin', 'updated_by_admin')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'updated_by_admin':
+            return queryset.filter(action__startswith='updated_by_admin_')
+        if self.value():
+            return queryset.filter(action=self.value())
+        return queryset
+
 @admin.register(UserActivity)
 class UserActivityAdmin(admin.ModelAdmin):
     list_display = ('user', 'action', 'timestamp', 'ip_address')
-    list_filter = ('action', 'timestamp')
-    search_fields = ('user__username', 'action', 'ip_address')
+    list_filter = (ActionListFilter, 'timestamp')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    search_fields = ('^user__username', '^action', '=ip_address')
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
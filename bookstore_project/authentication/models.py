@@ -28,9 +28,11 @@ class CustomUser(AbstractUser):
 
 
 class UserActivity(models.Model):
+    ACTIONS = ('registration', 'login', 'logout', 'self_update')
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='activities')
     action = models.CharField(max_length=100)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
@@ -38,6 +40,9 @@ class UserActivity(models.Model):
         verbose_name = 'User Activity'
         verbose_name_plural = 'User Activities'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['action', '-timestamp']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.timestamp}"
@@ -0,0 +1,53 @@
+"""
+Path-scoped variants of Django's stateful middleware.
+
+Requests under settings.STATELESS_PATH_PREFIXES (the JSON API) skip session
+loading, authentication from the session, CSRF token handling, message
+storage and the X-Frame-Options header. Every other path, /admin/ included,
+runs the stock middleware. Paths under settings.STATEFUL_PATH_PREFIXES keep
+the full stack even inside a stateless prefix.
+"""
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware as BaseXFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware as BaseCsrfViewMiddleware
+
+
+def is_stateless(path):
+    return (
+        path.startswith(tuple(settings.STATELESS_PATH_PREFIXES))
+        and not path.startswith(tuple(settings.STATEFUL_PATH_PREFIXES))
+    )
+
+
+class StatefulOnlyMixin:
+    def __call__(self, request):
+        if is_stateless(request.path_info):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(StatefulOnlyMixin, BaseSessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(StatefulOnlyMixin, BaseAuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(StatefulOnlyMixin, BaseMessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(StatefulOnlyMixin, BaseXFrameOptionsMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(StatefulOnlyMixin, BaseCsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_stateless(request.path_info):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
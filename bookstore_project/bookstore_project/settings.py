@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,14 +46,21 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'bookstore_project.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'bookstore_project.middleware.CsrfViewMiddleware',
+    'bookstore_project.middleware.AuthenticationMiddleware',
+    'bookstore_project.middleware.MessageMiddleware',
+    'bookstore_project.middleware.XFrameOptionsMiddleware',
 ]
 
+# The JSON API never uses sessions, CSRF cookies, messages or templates, so
+# the stateful middleware above is skipped for these path prefixes. Paths
+# in STATEFUL_PATH_PREFIXES keep the full stack, e.g. endpoints meant for
+# staff logged in through the admin.
+STATELESS_PATH_PREFIXES = ['/main/']
+STATEFUL_PATH_PREFIXES = ['/main/book/reprice/']
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -69,6 +77,33 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Deletion tombstones older than this are pruned; sync tokens issued before
+# the window are rejected and the client must download the full list again.
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Sync tokens trail the clock by this much so rows written by transactions
+# still open when a token is issued reach the next delta. Keep it longer
+# than the slowest catalog write transaction (e.g. a large repricing).
+SYNC_COMMIT_WINDOW = timedelta(minutes=5)
+
+# How long a stock reservation holds books before release_expired_reservations
+# hands the stock back.
+RESERVATION_TTL = timedelta(minutes=15)
+
+# Each process's typeahead index is reloaded from the database on the first
+# query after this age, bounding drift from changes no signal reports.
+TYPEAHEAD_MAX_AGE = timedelta(minutes=15)
+
+# Pre-rendered catalog pages written by build_catalog_snapshots. The first
+# CATALOG_SNAPSHOT_LISTING_PAGES book listing pages of each genre are kept.
+# To hand files to the web server instead of streaming them from Django, set
+# CATALOG_SNAPSHOT_SENDFILE_HEADER (e.g. 'X-Sendfile', or 'X-Accel-Redirect'
+# with CATALOG_SNAPSHOT_SENDFILE_ROOT set to the matching internal location).
+CATALOG_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+CATALOG_SNAPSHOT_LISTING_PAGES = 3
+CATALOG_SNAPSHOT_SENDFILE_HEADER = None
+CATALOG_SNAPSHOT_SENDFILE_ROOT = None
+
 ROOT_URLCONF = 'bookstore_project.urls'
 
 TEMPLATES = [
@@ -1,7 +1,50 @@
 from django.contrib import admin
+from django.db.models import Q
 from main.models import Author, Book, Publisher, Genre
+from main.lookups import prefix_range
+from main.paginators import EstimatedCountPaginator
 
-admin.site.register(Author)
-admin.site.register(Book)
-admin.site.register(Publisher)
-admin.site.register(Genre)
+
+class CatalogAdmin(admin.ModelAdmin):
+    list_display = ('name', 'updated_at')
+    search_fields = ('name',)
+    ordering = ('name',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_search_results(self, request, queryset, search_term):
+        # The whole term is one name prefix, tried as typed and capitalized.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q()
+        for prefix in dict.fromkeys((term, term[:1].upper() + term[1:])):
+            condition |= prefix_range('name', prefix)
+        return queryset.filter(condition), False
+
+
+@admin.register(Author)
+class AuthorAdmin(CatalogAdmin):
+    pass
+
+
+@admin.register(Publisher)
+class PublisherAdmin(CatalogAdmin):
+    pass
+
+
+@admin.register(Genre)
+class GenreAdmin(CatalogAdmin):
+    pass
+
+
+@admin.register(Book)
+class BookAdmin(CatalogAdmin):
+    list_display = ('name', 'author', 'publisher', 'genre', 'price', 'updated_at')
+    list_select_related = ('author', 'publisher')
+    autocomplete_fields = ('author', 'publisher')
+    ordering = ('-pk',)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Stock is set once on creation, then only changed by main.inventory.
+        return ('stock',) if obj is not None else ()
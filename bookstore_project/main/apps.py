@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuthorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from main import signals  # noqa: F401
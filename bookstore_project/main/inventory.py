@@ -0,0 +1,133 @@
+"""Stock reservations for books.
+
+Stock is only ever changed with conditional ``UPDATE ... SET stock = stock - n
+WHERE stock >= n`` statements, so concurrent buyers of the same title cannot
+oversell it and no row lock outlives the short transaction that takes it.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from main import sync
+from main.models import Book, Reservation, ReservationItem
+from main.signals import reservation_confirmed
+
+
+class OutOfStock(Exception):
+    def __init__(self, book_id):
+        super().__init__(f"Not enough stock for book {book_id}")
+        self.book_id = book_id
+
+
+class UnknownBook(Exception):
+    def __init__(self, book_id):
+        super().__init__(f"No book with id {book_id}")
+        self.book_id = book_id
+
+
+def reservation_ttl():
+    return settings.RESERVATION_TTL
+
+
+def reserve(items, ttl=None, user=None):
+    """Hold ``quantity`` of every book in ``items``, an iterable of
+    ``(book_id, quantity)`` pairs, for ``user``; or raise ``OutOfStock`` or
+    ``UnknownBook`` and hold nothing."""
+    wanted = Counter()
+    for book_id, quantity in items:
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        wanted[book_id] += quantity
+    if not wanted:
+        raise ValueError("A reservation needs at least one item")
+
+    now = timezone.now()
+    with transaction.atomic():
+        # A fixed lock order keeps concurrent multi-book reservations from deadlocking.
+        for book_id in sorted(wanted):
+            taken = (
+                Book.objects
+                .filter(pk=book_id, stock__gte=wanted[book_id])
+                .update(stock=F('stock') - wanted[book_id], updated_at=now)
+            )
+            if not taken:
+                if not Book.objects.filter(pk=book_id).exists():
+                    raise UnknownBook(book_id)
+                raise OutOfStock(book_id)
+        reservation = Reservation.objects.create(user=user, expires_at=now + (ttl or reservation_ttl()))
+        ReservationItem.objects.bulk_create(
+            ReservationItem(reservation=reservation, book_id=book_id, quantity=quantity)
+            for book_id, quantity in sorted(wanted.items())
+        )
+        # Last, so the counter's row lock is held as briefly as possible.
+        sync.bump_versions(Book)
+    return reservation
+
+
+def restock(book_id, quantity):
+    """Add ``quantity`` copies of a book to its stock, or take them away if it
+    is negative. Raises ``UnknownBook``, or ``OutOfStock`` rather than going
+    below zero."""
+    now = timezone.now()
+    with transaction.atomic():
+        changed = (
+            Book.objects
+            .filter(pk=book_id, stock__gte=max(-quantity, 0))
+            .update(stock=F('stock') + quantity, updated_at=now)
+        )
+        if not changed:
+            if not Book.objects.filter(pk=book_id).exists():
+                raise UnknownBook(book_id)
+            raise OutOfStock(book_id)
+        sync.bump_versions(Book)
+
+
+def _finish(reservation_id, status, **conditions):
+    """Move an active reservation to ``status``; return stock unless confirming."""
+    with transaction.atomic():
+        finished = (
+            Reservation.objects
+            .filter(pk=reservation_id, status=Reservation.ACTIVE, **conditions)
+            .update(status=status)
+        )
+        if finished:
+            items = list(
+                ReservationItem.objects.filter(reservation_id=reservation_id)
+                .order_by('book_id').values_list('book_id', 'quantity')
+            )
+            if status == Reservation.CONFIRMED:
+                transaction.on_commit(lambda: reservation_confirmed.send(sender=Reservation, items=items))
+            else:
+                now = timezone.now()
+                for book_id, quantity in items:
+                    Book.objects.filter(pk=book_id).update(stock=F('stock') + quantity, updated_at=now)
+                sync.bump_versions(Book)
+    return bool(finished)
+
+
+def confirm(reservation_id):
+    """Turn an unexpired hold into a sale. Returns ``False`` if it is no longer active."""
+    return _finish(reservation_id, Reservation.CONFIRMED, expires_at__gt=timezone.now())
+
+
+def release(reservation_id):
+    """Give the held stock back. Returns ``False`` if the hold was not active."""
+    return _finish(reservation_id, Reservation.RELEASED)
+
+
+def release_expired(batch_size=500):
+    """Expire every active hold past its ``expires_at`` and return how many were released."""
+    released = 0
+    while True:
+        expired = list(
+            Reservation.objects
+            .filter(status=Reservation.ACTIVE, expires_at__lte=timezone.now())
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not expired:
+            return released
+        for reservation_id in expired:
+            released += _finish(reservation_id, Reservation.EXPIRED, expires_at__lte=timezone.now())
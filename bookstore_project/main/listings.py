@@ -0,0 +1,80 @@
+"""Maintenance of the denormalized ``BookListing`` table.
+
+Receivers in ``main.signals`` keep listings in step with single-row saves;
+``rebuild`` and ``check`` walk the whole catalog in id-ordered chunks for
+bulk loads and for verifying that nothing drifted.
+"""
+from django.db import transaction
+
+from main.models import Book, BookListing
+
+CHUNK_SIZE = 1000
+
+LISTED_FIELDS = ('name', 'author_id', 'author_name', 'publisher_id', 'publisher_name', 'genre', 'price', 'name_key')
+
+
+def name_key(name):
+    return name.lower()
+
+
+def source_rows(queryset):
+    """``{book_id: {field: value}}`` for the books in ``queryset``, read with one joined query."""
+    rows = queryset.values_list(
+        'pk', 'name', 'author_id', 'author__name', 'publisher_id', 'publisher__name', 'genre', 'price',
+    )
+    return {row[0]: dict(zip(LISTED_FIELDS, (*row[1:], name_key(row[1])))) for row in rows}
+
+
+def _upsert(rows):
+    BookListing.objects.bulk_create(
+        [BookListing(book_id=pk, **values) for pk, values in rows.items()],
+        update_conflicts=True, unique_fields=['book'], update_fields=list(LISTED_FIELDS),
+    )
+
+
+def refresh(book_ids):
+    """Bring the listings of ``book_ids`` up to date with their source rows."""
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), CHUNK_SIZE):
+        _upsert(source_rows(Book.objects.filter(pk__in=book_ids[start:start + CHUNK_SIZE])))
+
+
+def _chunks():
+    last_pk = 0
+    while True:
+        rows = source_rows(Book.objects.filter(pk__gt=last_pk).order_by('pk')[:CHUNK_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_pk = max(rows)
+
+
+def rebuild():
+    """Rewrite every listing from the source tables; returns the number of books listed."""
+    listed = 0
+    for rows in _chunks():
+        with transaction.atomic():
+            _upsert(rows)
+        listed += len(rows)
+    return listed
+
+
+def check(fix=False):
+    """Compare listings with their source rows.
+
+    Returns ``(missing, stale)`` lists of book ids; with ``fix`` they are
+    rewritten as they are found.
+    """
+    missing, stale = [], []
+    for rows in _chunks():
+        listed = {
+            row[0]: dict(zip(LISTED_FIELDS, row[1:]))
+            for row in BookListing.objects.filter(book_id__in=list(rows)).values_list('book_id', *LISTED_FIELDS)
+        }
+        chunk_missing = [pk for pk in rows if pk not in listed]
+        chunk_stale = [pk for pk in rows if pk in listed and listed[pk] != rows[pk]]
+        if fix and (chunk_missing or chunk_stale):
+            _upsert({pk: rows[pk] for pk in chunk_missing + chunk_stale})
+        missing += chunk_missing
+        stale += chunk_stale
+    return missing, stale
@@ -0,0 +1,13 @@
+from django.db.models import Q
+
+
+def prefix_range(field, prefix):
+    """Case-sensitive ``field`` prefix match that an ordinary B-tree index can serve.
+
+    ``istartswith`` compiles to ``UPPER(col) LIKE`` on PostgreSQL and to a
+    LIKE that SQLite will not optimize, so both scan the table. The range
+    bounds the index scan; ``startswith`` drops anything a non-C collation
+    lets into the range.
+    """
+    upper = prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10FFFF))
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper, f'{field}__startswith': prefix})
@@ -0,0 +1,39 @@
+import time
+
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from main import typeahead
+
+
+class Command(BaseCommand):
+    help = "Measure per-request middleware overhead of the lean and full profiles on a stateless API route."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--path', default='/main/typeahead/?q=zz',
+                            help="A cheap route, so middleware dominates the measured time.")
+
+    def measure(self, path, count):
+        handler = BaseHandler()
+        handler.load_middleware()
+        factory = RequestFactory()
+        for _ in range(100):
+            handler.get_response(factory.get(path))
+        start = time.perf_counter()
+        for _ in range(count):
+            handler.get_response(factory.get(path))
+        return (time.perf_counter() - start) / count
+
+    def handle(self, *args, **options):
+        count, path = options['requests'], options['path']
+        typeahead.index.ensure_built()
+        with override_settings(STATELESS_PATH_PREFIXES=[], ALLOWED_HOSTS=['testserver']):
+            full = self.measure(path, count)
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            lean = self.measure(path, count)
+        self.stdout.write(f"{count} requests to {path}")
+        self.stdout.write(f"full stack: {full * 1e6:8.1f} us/request")
+        self.stdout.write(f"lean stack: {lean * 1e6:8.1f} us/request")
+        self.stdout.write(f"saved:      {(full - lean) * 1e6:8.1f} us/request ({(full - lean) / full:.0%})")
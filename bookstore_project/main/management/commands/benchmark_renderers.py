@@ -0,0 +1,55 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from main.models import Author, Publisher, Book
+from main.renderers import ColumnarJSONRenderer, MessagePackRenderer, msgpack
+from main.serializers import BookSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and encode time of the catalog response formats on synthetic books."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        authors = [Author(pk=i, name=f'Author {i}') for i in range(1, 501)]
+        publishers = [Publisher(pk=i, name=f'Publisher {i}') for i in range(1, 51)]
+        books = [
+            Book(
+                pk=i, name=f'Book title {i}', author=authors[i % len(authors)],
+                publisher=publishers[i % len(publishers)],
+                price=Decimal(i % 9000 + 100) / 100, genre=f'Genre {i % 20}',
+            )
+            for i in range(1, rows + 1)
+        ]
+
+        renderers = [JSONRenderer(), ColumnarJSONRenderer()]
+        if msgpack is not None:
+            renderers.append(MessagePackRenderer())
+        else:
+            self.stderr.write("msgpack is not installed, skipping MessagePack")
+
+        baseline = None
+        self.stdout.write(f"{rows} books, best of {repeat}")
+        self.stdout.write(f"{'format':<12}{'bytes':>12}{'size':>8}{'encode ms':>12}{'speed':>8}")
+        for renderer in renderers:
+            coerce = getattr(renderer, 'coerce_decimal_to_string', None)
+            data = BookSerializer(books, many=True, context={'coerce_decimal_to_string': coerce}).data
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                payload = renderer.render(data)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            if baseline is None:
+                baseline = (len(payload), best)
+            self.stdout.write(
+                f"{renderer.format:<12}{len(payload):>12}{len(payload) / baseline[0]:>7.2f}x"
+                f"{best * 1000:>12.2f}{baseline[1] / best:>7.2f}x"
+            )
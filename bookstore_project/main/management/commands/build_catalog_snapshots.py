@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main import snapshots
+
+
+class Command(BaseCommand):
+    help = "Render missing or outdated catalog snapshots to CATALOG_SNAPSHOT_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-render every shard.")
+
+    def handle(self, *args, **options):
+        written, removed = snapshots.build(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} snapshots, removed {removed}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main import similarity
+
+
+class Command(BaseCommand):
+    help = "Refresh the top-K similar books table for books whose attributes changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10, help="Neighbors kept per book.")
+        parser.add_argument('--chunk-size', type=int, default=256, help="Books scored per batch.")
+        parser.add_argument('--full', action='store_true', help="Recompute every book, e.g. after changing --k.")
+
+    def handle(self, *args, **options):
+        recomputed = similarity.build(k=options['k'], chunk_size=options['chunk_size'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed neighbors for {recomputed} books"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import listings
+
+
+class Command(BaseCommand):
+    help = "Report BookListing rows that are missing or differ from their source rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the listings that are out of date.")
+
+    def handle(self, *args, **options):
+        missing, stale = listings.check(fix=options['fix'])
+        if not missing and not stale:
+            self.stdout.write(self.style.SUCCESS("All book listings are consistent"))
+            return
+        message = f"{len(missing)} missing and {len(stale)} stale listings"
+        if options['fix']:
+            self.stdout.write(self.style.WARNING(f"Fixed {message}"))
+            return
+        if missing:
+            self.stderr.write(f"Missing: {', '.join(map(str, missing[:20]))}")
+        if stale:
+            self.stderr.write(f"Stale: {', '.join(map(str, stale[:20]))}")
+        raise CommandError(message)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import sync
+
+
+class Command(BaseCommand):
+    help = "Delete deletion tombstones older than SYNC_TOMBSTONE_RETENTION."
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstones"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main import listings
+
+
+class Command(BaseCommand):
+    help = "Rewrite the BookListing read model from Book, Author and Publisher."
+
+    def handle(self, *args, **options):
+        listed = listings.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Listed {listed} books"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main import inventory
+
+
+class Command(BaseCommand):
+    help = "Return the stock of expired reservations. Run it periodically, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired reservations"))
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import pricing
+
+
+class Command(BaseCommand):
+    help = "Bulk reprice books from a JSON {book_id: price} file or a percent-off rule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prices', help="Path to a JSON object mapping book ids to new prices.")
+        parser.add_argument('--percent-off', help="Discount matching books by this percentage.")
+        parser.add_argument('--genre')
+        parser.add_argument('--publisher', type=int)
+        parser.add_argument('--author', type=int)
+        parser.add_argument('--reason', default='')
+
+    def handle(self, *args, **options):
+        if bool(options['prices']) == bool(options['percent_off']):
+            raise CommandError("Pass exactly one of --prices or --percent-off")
+        try:
+            if options['prices']:
+                with open(options['prices']) as f:
+                    prices = json.load(f, parse_float=str)
+                batch = pricing.reprice_by_map(prices, reason=options['reason'])
+            else:
+                batch = pricing.reprice_by_rule(
+                    options['percent_off'], genre=options['genre'], publisher=options['publisher'],
+                    author=options['author'], reason=options['reason'],
+                )
+        except pricing.RepricingError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Batch {batch.pk}: repriced {batch.changed_count} books"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_similar_books'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChangeBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('rule', models.JSONField(blank=True, null=True)),
+                ('changed_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(db_index=True)),
+                ('old_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('new_price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='main.pricechangebatch')),
+            ],
+        ),
+    ]
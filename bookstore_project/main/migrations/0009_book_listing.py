@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_listings(apps, schema_editor):
+    Book = apps.get_model('main', 'Book')
+    BookListing = apps.get_model('main', 'BookListing')
+    rows = Book.objects.order_by('pk').values_list(
+        'pk', 'name', 'author_id', 'author__name', 'publisher_id', 'publisher__name', 'genre', 'price',
+    )
+    batch = []
+    for pk, name, author_id, author_name, publisher_id, publisher_name, genre, price in rows.iterator(chunk_size=1000):
+        batch.append(BookListing(
+            book_id=pk, name=name, author_id=author_id, author_name=author_name,
+            publisher_id=publisher_id, publisher_name=publisher_name, genre=genre, price=price,
+        ))
+        if len(batch) == 1000:
+            BookListing.objects.bulk_create(batch)
+            batch = []
+    BookListing.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookListing',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='main.book')),
+                ('name', models.CharField(max_length=50)),
+                ('author_id', models.BigIntegerField()),
+                ('author_name', models.CharField(max_length=50)),
+                ('publisher_id', models.BigIntegerField(null=True)),
+                ('publisher_name', models.CharField(max_length=50, null=True)),
+                ('genre', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['genre', 'price'], name='main_bookli_genre_9cfe0b_idx'), models.Index(fields=['genre', 'name'], name='main_bookli_genre_557d4d_idx'), models.Index(fields=['author_id', 'name'], name='main_bookli_author__a59bf4_idx'), models.Index(fields=['publisher_id', 'name'], name='main_bookli_publish_92e885_idx'), models.Index(fields=['price'], name='main_bookli_price_1fbafa_idx'), models.Index(fields=['name'], name='main_bookli_name_ce915b_idx')],
+            },
+        ),
+        migrations.RunPython(populate_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:39
+
+from django.db import migrations, models
+
+
+def populate_name_keys(apps, schema_editor):
+    BookListing = apps.get_model('main', 'BookListing')
+    batch = []
+    for listing in BookListing.objects.only('pk', 'name').iterator(chunk_size=1000):
+        listing.name_key = listing.name.lower()
+        batch.append(listing)
+        if len(batch) == 1000:
+            BookListing.objects.bulk_update(batch, ['name_key'])
+            batch = []
+    BookListing.objects.bulk_update(batch, ['name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_reservation_user'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_genre_9cfe0b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_genre_557d4d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_author__a59bf4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_publish_92e885_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_price_1fbafa_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booklisting',
+            name='main_bookli_name_ce915b_idx',
+        ),
+        migrations.AddField(
+            model_name='booklisting',
+            name='name_key',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['genre', 'price', 'book'], name='main_bookli_genre_cdcc6a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['genre', 'name', 'book'], name='main_bookli_genre_4ae7e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['author_id', 'name', 'book'], name='main_bookli_author__928ca4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['publisher_id', 'name', 'book'], name='main_bookli_publish_1d90db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['price', 'book'], name='main_bookli_price_d2d73c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['name', 'book'], name='main_bookli_name_1cb146_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['name_key'], name='main_bookli_name_ke_1f7c5a_idx'),
+        ),
+    ]
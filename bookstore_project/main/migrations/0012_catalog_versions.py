@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+def create_counters(apps, schema_editor):
+    CatalogVersion = apps.get_model('main', 'CatalogVersion')
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(model=name) for name in ('author', 'publisher', 'genre', 'book')], ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_listing_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('model', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
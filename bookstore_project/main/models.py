@@ -1,17 +1,150 @@
+from django.conf import settings
 from django.db import models
 
 class Author(models.Model):
-    name = models.CharField(max_length = 50)
+    name = models.CharField(max_length = 50, db_index = True)
+    updated_at = models.DateTimeField(auto_now = True, db_index = True)
+
+    def __str__(self):
+        return self.name
 
 class Publisher(models.Model):
-    name = models.CharField(max_length = 50)
+    name = models.CharField(max_length = 50, db_index = True)
+    updated_at = models.DateTimeField(auto_now = True, db_index = True)
+
+    def __str__(self):
+        return self.name
 
 class Genre(models.Model):
-    name = models.CharField(max_length = 50)
+    name = models.CharField(max_length = 50, db_index = True)
+    updated_at = models.DateTimeField(auto_now = True, db_index = True)
+
+    def __str__(self):
+        return self.name
 
 class Book(models.Model):
-    name = models.CharField(max_length = 50)
+    name = models.CharField(max_length = 50, db_index = True)
     author = models.ForeignKey(Author, on_delete = models.PROTECT)
     publisher = models.ForeignKey(Publisher, on_delete = models.SET_NULL, null = True)
     price = models.DecimalField(max_digits = 6, decimal_places = 2)
     genre = models.CharField(max_length = 50)
+    stock = models.PositiveIntegerField(default = 0)
+    updated_at = models.DateTimeField(auto_now = True, db_index = True)
+
+    def save(self, *args, **kwargs):
+        # Stock only moves through the conditional updates in main.inventory; a full
+        # save of an instance loaded earlier would write its stale count back.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'stock'
+            ]
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+class Tombstone(models.Model):
+    """Records a deleted catalog row so delta sync clients can drop it."""
+    model = models.CharField(max_length = 50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add = True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['model', 'deleted_at']),
+        ]
+
+class CatalogVersion(models.Model):
+    """Change counter for one catalog model, bumped in the transaction of every write.
+
+    Concurrent bumps of a row serialize on its lock, so the counter grows in
+    commit order, which ``updated_at`` (stamped at write time) does not.
+    """
+    model = models.CharField(max_length = 50, primary_key = True)
+    version = models.BigIntegerField(default = 0)
+
+class BookNeighbor(models.Model):
+    """One of the top-K most similar books to ``book``, built by ``build_similar_books``."""
+    book = models.ForeignKey(Book, on_delete = models.CASCADE, related_name = 'neighbors', db_index = False)
+    neighbor = models.ForeignKey(Book, on_delete = models.CASCADE, related_name = '+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['book', 'rank'], name = 'unique_book_neighbor_rank'),
+        ]
+
+class BookSimilarityState(models.Model):
+    """Fingerprint of the attributes a book's neighbors were last computed from."""
+    book = models.OneToOneField(Book, on_delete = models.CASCADE, primary_key = True, related_name = 'similarity_state')
+    fingerprint = models.CharField(max_length = 32)
+
+class PriceChangeBatch(models.Model):
+    """One bulk repricing run; its per-book changes live in ``PriceChange``."""
+    reason = models.CharField(max_length = 200, blank = True)
+    rule = models.JSONField(null = True, blank = True)
+    changed_count = models.PositiveIntegerField(default = 0)
+    created_at = models.DateTimeField(auto_now_add = True)
+
+class PriceChange(models.Model):
+    batch = models.ForeignKey(PriceChangeBatch, on_delete = models.CASCADE, related_name = 'changes')
+    book_id = models.BigIntegerField(db_index = True)
+    old_price = models.DecimalField(max_digits = 6, decimal_places = 2)
+    new_price = models.DecimalField(max_digits = 6, decimal_places = 2)
+
+class Reservation(models.Model):
+    """A hold on book stock that is confirmed, released, or expires at ``expires_at``."""
+    ACTIVE = 'active'
+    CONFIRMED = 'confirmed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (ACTIVE, 'Active'),
+        (CONFIRMED, 'Confirmed'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete = models.CASCADE, null = True, related_name = 'reservations')
+    status = models.CharField(max_length = 10, choices = STATUS_CHOICES, default = ACTIVE)
+    created_at = models.DateTimeField(auto_now_add = True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['status', 'expires_at']),
+        ]
+
+class ReservationItem(models.Model):
+    reservation = models.ForeignKey(Reservation, on_delete = models.CASCADE, related_name = 'items')
+    book = models.ForeignKey(Book, on_delete = models.CASCADE)
+    quantity = models.PositiveIntegerField()
+
+class BookListing(models.Model):
+    """Denormalized copy of a book with its author and publisher names, so
+    filtered and sorted listings scan one table. Maintained by ``main.listings``."""
+    book = models.OneToOneField(Book, on_delete = models.CASCADE, primary_key = True, related_name = 'listing')
+    name = models.CharField(max_length = 50)
+    # Lowercased name, so the title prefix filter is an index range scan.
+    name_key = models.CharField(max_length = 100)
+    author_id = models.BigIntegerField()
+    author_name = models.CharField(max_length = 50)
+    publisher_id = models.BigIntegerField(null = True)
+    publisher_name = models.CharField(max_length = 50, null = True)
+    genre = models.CharField(max_length = 50)
+    price = models.DecimalField(max_digits = 6, decimal_places = 2)
+
+    class Meta:
+        # Each index ends with the sort keys, book included as the tie-breaker,
+        # so filtered pages are read in order without a sort step.
+        indexes = [
+            models.Index(fields = ['genre', 'price', 'book']),
+            models.Index(fields = ['genre', 'name', 'book']),
+            models.Index(fields = ['author_id', 'name', 'book']),
+            models.Index(fields = ['publisher_id', 'name', 'book']),
+            models.Index(fields = ['price', 'book']),
+            models.Index(fields = ['name', 'book']),
+            models.Index(fields = ['name_key']),
+        ]
@@ -0,0 +1,46 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists over very large tables.
+
+    Unfiltered querysets on PostgreSQL are counted from the planner's row
+    estimate. Everywhere else the count is capped at ``max_count`` rows, so
+    counting never scans more than a bounded slice of the table. Pages past
+    an estimated or capped count stay reachable: asking for one recounts
+    just far enough to tell whether it exists, which is no more than the
+    page's own OFFSET has to read.
+    """
+    max_count = ESTIMATE_THRESHOLD
+
+    def _count_up_to(self, limit):
+        return self.object_list.values('pk')[:limit].count()
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATE_THRESHOLD:
+                return row[0]
+        return self._count_up_to(self.max_count)
+
+    def validate_number(self, number):
+        try:
+            wanted = int(number)
+        except (TypeError, ValueError):
+            wanted = None
+        if wanted is not None and wanted > self.num_pages and self.count >= self.max_count:
+            self.count = self._count_up_to(wanted * self.per_page + self.orphans + 1)
+            self.__dict__.pop('num_pages', None)
+        return super().validate_number(number)
@@ -0,0 +1,118 @@
+"""Bulk repricing of books.
+
+Every run reads and rewrites prices in id-ordered batches of ``BATCH_SIZE``
+books, three statements per batch (select, bulk update, audit insert), all
+inside one transaction. Either every requested price changes or none does.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from main import sync
+from main.models import Book, PriceChange, PriceChangeBatch
+from main.signals import books_repriced
+
+BATCH_SIZE = 1000
+MAX_BOOK_ID = 2**63 - 1
+
+_price_field = Book._meta.get_field('price')
+CENT = Decimal(1).scaleb(-_price_field.decimal_places)
+MAX_PRICE = Decimal(10 ** (_price_field.max_digits - _price_field.decimal_places)) - CENT
+
+
+class RepricingError(ValueError):
+    pass
+
+
+def validate_price(price):
+    price = Decimal(price)
+    if price < 0 or price > MAX_PRICE:
+        raise RepricingError(f"Price {price} is outside 0..{MAX_PRICE}")
+    if price != price.quantize(CENT):
+        raise RepricingError(f"Price {price} has more than {_price_field.decimal_places} decimal places")
+    return price.quantize(CENT)
+
+
+def _apply(batches, reason, rule):
+    """Write new prices from ``batches``, an iterable of ``[(pk, old, new), ...]`` lists."""
+    changed_ids = []
+    with transaction.atomic():
+        price_batch = PriceChangeBatch.objects.create(reason=reason, rule=rule)
+        for rows in batches:
+            rows = [(pk, old, new) for pk, old, new in rows if old != new]
+            if not rows:
+                continue
+            now = timezone.now()
+            Book.objects.bulk_update(
+                [Book(pk=pk, price=new, updated_at=now) for pk, _, new in rows],
+                ['price', 'updated_at'], batch_size=BATCH_SIZE,
+            )
+            PriceChange.objects.bulk_create(
+                [PriceChange(batch=price_batch, book_id=pk, old_price=old, new_price=new) for pk, old, new in rows],
+                batch_size=BATCH_SIZE,
+            )
+            changed_ids += [pk for pk, _, _ in rows]
+        price_batch.changed_count = len(changed_ids)
+        price_batch.save(update_fields=['changed_count'])
+        if changed_ids:
+            sync.bump_versions(Book)
+        transaction.on_commit(lambda: books_repriced.send(sender=Book, book_ids=changed_ids))
+    return price_batch
+
+
+def reprice_by_map(prices, reason=''):
+    """Set explicit prices from a ``{book_id: price}`` mapping."""
+    try:
+        prices = {int(pk): validate_price(price) for pk, price in prices.items()}
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise RepricingError(str(e) or "Invalid price map")
+    out_of_range = [pk for pk in prices if not 0 < pk <= MAX_BOOK_ID]
+    if out_of_range:
+        raise RepricingError(f"Book id(s) out of range: {', '.join(map(str, out_of_range))}")
+    ids = sorted(prices)
+
+    def batches():
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            current = dict(
+                Book.objects.select_for_update().filter(pk__in=chunk).values_list('pk', 'price')
+            )
+            missing = [pk for pk in chunk if pk not in current]
+            if missing:
+                raise RepricingError(f"Unknown book id(s): {', '.join(map(str, missing))}")
+            yield [(pk, current[pk], prices[pk]) for pk in chunk]
+
+    return _apply(batches(), reason, rule=None)
+
+
+def reprice_by_rule(percent_off, genre=None, publisher=None, author=None, reason=''):
+    """Discount every book matching all of the given filters by ``percent_off``."""
+    try:
+        percent_off = Decimal(percent_off)
+        valid = 0 < percent_off < 100
+    except (TypeError, ValueError, ArithmeticError):
+        valid = False
+    if not valid:
+        raise RepricingError("percent_off must be between 0 and 100")
+    filters = {
+        key: value
+        for key, value in (('genre', genre), ('publisher_id', publisher), ('author_id', author))
+        if value is not None
+    }
+    if not filters:
+        raise RepricingError("A rule needs at least one of genre, publisher or author")
+    factor = (100 - percent_off) / 100
+    queryset = Book.objects.select_for_update().filter(**filters).order_by('pk')
+
+    def batches():
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'price')[:BATCH_SIZE])
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield [(pk, old, (old * factor).quantize(CENT, rounding=ROUND_HALF_UP)) for pk, old in rows]
+
+    rule = {'percent_off': str(percent_off), **filters}
+    return _apply(batches(), reason, rule)
@@ -0,0 +1,83 @@
+"""Compact response formats for bulk catalog clients.
+
+Both renderers ask the view for raw ``Decimal`` values instead of strings
+(``coerce_decimal_to_string = False``) and encode them losslessly:
+
+* MessagePack carries each ``Decimal`` as ext type ``DECIMAL_EXT_TYPE``
+  whose payload is the ASCII decimal string, e.g. ``b"12.50"``.
+* Columnar JSON stores a decimal column as integers in minor units and
+  lists the power of ten to divide by under ``"scale"``.
+"""
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DECIMAL_EXT_TYPE = 1
+
+
+def columnarize(rows):
+    """Turn a list of dicts into ``{"count", "columns", "data", "scale"}``."""
+    columns = list(rows[0]) if rows else []
+    data = {column: [row[column] for row in rows] for column in columns}
+    scale = {}
+    for column, values in data.items():
+        sample = next((value for value in values if value is not None), None)
+        if not isinstance(sample, Decimal):
+            continue
+        places = max(-min(value.as_tuple().exponent for value in values if value is not None), 0)
+        factor = Decimal(10) ** places
+        data[column] = [None if value is None else int(value * factor) for value in values]
+        scale[column] = places
+    return {'count': len(rows), 'columns': columns, 'data': data, 'scale': scale}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON with one array per field instead of one object per row.
+
+    A list payload is columnarized whole; in a dict payload, the row lists
+    named by the view's ``columnar_keys`` (default ``("results",)``) are.
+    """
+    media_type = 'application/vnd.bookstore.columnar+json'
+    format = 'columnar'
+    coerce_decimal_to_string = False
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, list):
+            data = columnarize(data)
+        elif isinstance(data, dict):
+            view = (renderer_context or {}).get('view')
+            keys = getattr(view, 'columnar_keys', ('results',))
+            data = {
+                key: columnarize(value) if key in keys and isinstance(value, list) else value
+                for key, value in data.items()
+            }
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    coerce_decimal_to_string = False
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encode_extra, use_bin_type=True)
+
+    @staticmethod
+    def encode_extra(obj):
+        if isinstance(obj, Decimal):
+            return msgpack.ExtType(DECIMAL_EXT_TYPE, str(obj).encode('ascii'))
+        raise TypeError(f"Cannot serialize {type(obj).__name__} to MessagePack")
+
+
+CATALOG_RENDERER_CLASSES = [ColumnarJSONRenderer]
+if msgpack is not None:
+    CATALOG_RENDERER_CLASSES.append(MessagePackRenderer)
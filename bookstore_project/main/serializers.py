@@ -1,22 +1,98 @@
 from rest_framework import serializers
-from .models import Author, Publisher, Genre, Book
+from .models import Author, Publisher, Genre, Book, BookListing, Reservation, ReservationItem
 
-class AuthorSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Model serializer that can be trimmed with ``fields`` and can inline
+    the related objects named in ``expandable_fields`` via ``expand``.
+
+    Decimals stay ``Decimal`` when the context sets
+    ``coerce_decimal_to_string`` to ``False``, for renderers that encode
+    them losslessly themselves.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('coerce_decimal_to_string') is False:
+            for field in self.fields.values():
+                if isinstance(field, serializers.DecimalField):
+                    field.coerce_to_string = False
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields is not None:
+            keep = set(fields) | set(expand)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+class AuthorSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Author
         fields = '__all__'
 
-class PublisherSerializer(serializers.ModelSerializer):
+class PublisherSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Publisher
         fields = '__all__'
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Genre
         fields = '__all__'
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {
+        'author': AuthorSerializer,
+        'publisher': PublisherSerializer,
+    }
+
     class Meta:
         model = Book
         fields = '__all__'
+
+class BookListingSerializer(DynamicFieldsModelSerializer):
+    id = serializers.IntegerField(source='book_id', read_only=True)
+
+    class Meta:
+        model = BookListing
+        fields = ('id', 'name', 'author_id', 'author_name', 'publisher_id', 'publisher_name', 'genre', 'price')
+
+class RepriceRuleSerializer(serializers.Serializer):
+    percent_off = serializers.DecimalField(max_digits=5, decimal_places=2)
+    genre = serializers.CharField(max_length=50, required=False)
+    publisher = serializers.IntegerField(required=False, min_value=1, max_value=2**63 - 1)
+    author = serializers.IntegerField(required=False, min_value=1, max_value=2**63 - 1)
+
+class RepriceSerializer(serializers.Serializer):
+    prices = serializers.DictField(
+        child=serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0),
+        required=False,
+    )
+    rule = RepriceRuleSerializer(required=False)
+    reason = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if ('prices' in data) == ('rule' in data):
+            raise serializers.ValidationError("Provide exactly one of prices or rule.")
+        return data
+
+class ReservationItemSerializer(serializers.ModelSerializer):
+    book = serializers.IntegerField(source='book_id', min_value=1, max_value=2**63 - 1)
+    quantity = serializers.IntegerField(min_value=1, max_value=2**31 - 1)
+
+    class Meta:
+        model = ReservationItem
+        fields = ('book', 'quantity')
+
+class ReservationSerializer(serializers.ModelSerializer):
+    items = ReservationItemSerializer(many=True)
+
+    class Meta:
+        model = Reservation
+        fields = ('id', 'status', 'created_at', 'expires_at', 'items')
+        read_only_fields = ('id', 'status', 'created_at', 'expires_at')
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("A reservation needs at least one item.")
+        return value
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from main import listings, snapshots, sync, typeahead
+from main.models import Author, Publisher, Genre, Book, BookListing, Tombstone
+
+CATALOG_MODELS = (Author, Publisher, Genre, Book)
+
+# Sent after a bulk repricing commits, with ``book_ids`` of the books whose
+# price changed. Bulk updates bypass post_save, so read models listen here.
+books_repriced = Signal()
+
+# Sent after a reservation is confirmed and committed, with ``items``, a list
+# of ``(book_id, quantity)`` pairs sold. The confirmation is a queryset
+# update, so nothing else reports the sale.
+reservation_confirmed = Signal()
+
+
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=sender._meta.model_name, object_id=instance.pk)
+    sync.bump_versions(sender)
+
+
+def bump_catalog_version(sender, **kwargs):
+    sync.bump_versions(sender)
+
+
+# Connected per model: a post_delete listener without a sender would disable
+# Django's fast (single query) deletes for every model in the project.
+for model in CATALOG_MODELS:
+    post_delete.connect(record_tombstone, sender=model)
+    post_save.connect(bump_catalog_version, sender=model)
+
+
+@receiver(pre_delete, sender=Publisher)
+def touch_books_of_deleted_publisher(sender, instance, **kwargs):
+    # SET_NULL is applied with a queryset update, which skips auto_now and
+    # post_save, so bump the affected books here to keep them visible to
+    # delta sync and clear the publisher from their listings.
+    if Book.objects.filter(publisher=instance).update(updated_at=timezone.now()):
+        sync.bump_versions(Book)
+    BookListing.objects.filter(publisher_id=instance.pk).update(publisher_id=None, publisher_name=None)
+
+
+@receiver(post_save, sender=Book)
+def refresh_book_listing(sender, instance, **kwargs):
+    listings.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def rename_author_listings(sender, instance, **kwargs):
+    BookListing.objects.filter(author_id=instance.pk).update(author_name=instance.name)
+
+
+@receiver(post_save, sender=Publisher)
+def rename_publisher_listings(sender, instance, **kwargs):
+    BookListing.objects.filter(publisher_id=instance.pk).update(publisher_name=instance.name)
+
+
+@receiver(books_repriced)
+def refresh_repriced_listings(sender, book_ids, **kwargs):
+    listings.refresh(book_ids)
+
+
+def _update_typeahead(update):
+    def apply():
+        if typeahead.index.is_built:
+            update(typeahead.index)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    pk, name, author_id, publisher_id = instance.pk, instance.name, instance.author_id, instance.publisher_id
+    _update_typeahead(lambda index: index.upsert_book(pk, name, author_id, publisher_id))
+
+
+@receiver(reservation_confirmed)
+def index_sales(sender, items, **kwargs):
+    _update_typeahead(lambda index: index.record_sales(items))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+def index_saved_name(sender, instance, **kwargs):
+    kind, pk, name = sender._meta.model_name, instance.pk, instance.name
+    _update_typeahead(lambda index: index.upsert(kind, pk, name))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+def unindex_deleted(sender, instance, **kwargs):
+    kind, pk = sender._meta.model_name, instance.pk
+    _update_typeahead(lambda index: index.remove(kind, pk))
+
+
+def _invalidate_snapshots(lists=(), genres=()):
+    # After commit, so a build that read the old rows sees the shard's
+    # generation move and discards its file (see snapshots.build).
+    lists, genres = tuple(lists), {genre for genre in genres if genre}
+    transaction.on_commit(lambda: snapshots.invalidate(lists, genres))
+
+
+def _listed_genres(**filters):
+    return BookListing.objects.filter(**filters).values_list('genre', flat=True).distinct()
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_genre(sender, instance, **kwargs):
+    # A book that changes genre must also drop out of its old genre's pages.
+    instance._previous_genre = (
+        Book.objects.filter(pk=instance.pk).values_list('genre', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_snapshots(sender, instance, **kwargs):
+    _invalidate_snapshots(genres=[instance.genre, getattr(instance, '_previous_genre', None)])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+@receiver(pre_delete, sender=Publisher)
+def invalidate_name_snapshots(sender, instance, **kwargs):
+    kind = sender._meta.model_name
+    _invalidate_snapshots([kind], _listed_genres(**{f'{kind}_id': instance.pk}))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_list_snapshot(sender, instance, **kwargs):
+    _invalidate_snapshots([sender._meta.model_name])
+
+
+@receiver(books_repriced)
+def invalidate_repriced_snapshots(sender, book_ids, **kwargs):
+    book_ids = list(book_ids)
+    genres = set()
+    for start in range(0, len(book_ids), listings.CHUNK_SIZE):
+        genres.update(_listed_genres(book_id__in=book_ids[start:start + listings.CHUNK_SIZE]))
+    _invalidate_snapshots(genres=genres)
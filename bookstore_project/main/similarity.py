@@ -0,0 +1,175 @@
+"""Batch builder for the precomputed "similar books" table.
+
+Similarity is a weighted sum of matching author, genre and publisher plus
+price proximity. Scores are computed with NumPy one chunk of books against
+the whole catalog at a time, and only books whose neighbor lists can have
+changed since the last build are recomputed:
+
+* books whose fingerprint (author, publisher, genre, price) changed,
+* books that currently list a changed book as a neighbor,
+* books for which a changed book now scores above their K-th neighbor,
+* books with fewer than K neighbors, e.g. after a neighbor was deleted.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+
+from main.models import Book, BookNeighbor, BookSimilarityState
+
+AUTHOR_WEIGHT = 3.0
+GENRE_WEIGHT = 2.0
+PUBLISHER_WEIGHT = 1.0
+PRICE_WEIGHT = 1.0
+
+# Upper bound on the number of cells in one score matrix (float32), which
+# keeps a chunk of books scored against the catalog at about 64 MB.
+MAX_SCORE_CELLS = 1 << 24
+
+
+class Catalog:
+    """Column arrays of the similarity features of every book, ordered by id."""
+
+    def __init__(self, rows):
+        ids, authors, publishers, genres, prices = zip(*rows) if rows else ((),) * 5
+        self.ids = np.array(ids, dtype=np.int64)
+        self.authors = np.array(authors, dtype=np.int64)
+        self.publishers = np.array([-1 if pk is None else pk for pk in publishers], dtype=np.int64)
+        _, self.genres = np.unique(np.array(genres, dtype=object), return_inverse=True)
+        self.prices = np.array(prices, dtype=np.float64)
+        self.fingerprints = [
+            hashlib.md5(f"{row[1]}:{row[2]}:{row[3]}:{row[4]}".encode()).hexdigest()
+            for row in rows
+        ]
+
+    @classmethod
+    def load(cls):
+        rows = list(
+            Book.objects.order_by('id')
+            .values_list('id', 'author_id', 'publisher_id', 'genre', 'price')
+        )
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, rows, columns=None):
+        """Score matrix of books at positions ``rows`` against ``columns`` (default: all)."""
+        if columns is None:
+            columns = slice(None)
+        scores = AUTHOR_WEIGHT * (self.authors[rows, None] == self.authors[None, columns])
+        scores += GENRE_WEIGHT * (self.genres[rows, None] == self.genres[None, columns])
+        publishers = self.publishers[rows, None]
+        scores += PUBLISHER_WEIGHT * ((publishers == self.publishers[None, columns]) & (publishers != -1))
+        left, right = self.prices[rows, None], self.prices[None, columns]
+        scores += PRICE_WEIGHT * (1 - np.abs(left - right) / np.maximum(np.maximum(left, right), 0.01))
+        return scores.astype(np.float32)
+
+
+def chunk_rows(n_columns, chunk_size):
+    return max(1, min(chunk_size, MAX_SCORE_CELLS // max(n_columns, 1)))
+
+
+def find_dirty(catalog, k, changed):
+    """Positions of books whose neighbor list must be recomputed."""
+    n = len(catalog)
+    k_eff = min(k, n - 1)
+    dirty = np.zeros(n, dtype=bool)
+    dirty[changed] = True
+    if k_eff <= 0:
+        return np.flatnonzero(dirty)
+
+    counts = dict(BookNeighbor.objects.values_list('book_id').annotate(count=Count('id')))
+    dirty |= np.array([counts.get(pk, 0) < k_eff for pk in catalog.ids.tolist()], dtype=bool)
+    if not len(changed):
+        return np.flatnonzero(dirty)
+
+    changed_pks = catalog.ids[changed].tolist()
+    for start in range(0, len(changed_pks), 500):
+        referencing = BookNeighbor.objects.filter(neighbor_id__in=changed_pks[start:start + 500])
+        referencing = np.array(list(referencing.values_list('book_id', flat=True)), dtype=np.int64)
+        dirty[np.searchsorted(catalog.ids, referencing)] = True
+
+    thresholds = np.full(n, np.inf, dtype=np.float32)
+    kth_ids = np.full(n, -1, dtype=np.int64)
+    kth_rows = BookNeighbor.objects.filter(rank=k_eff - 1).values_list('book_id', 'neighbor_id', 'score')
+    for pk, neighbor_id, score in kth_rows.iterator(chunk_size=2000):
+        position = np.searchsorted(catalog.ids, pk)
+        if position < n and catalog.ids[position] == pk:
+            thresholds[position] = score
+            kth_ids[position] = neighbor_id
+
+    changed_ids = catalog.ids[changed]
+    step = chunk_rows(len(changed), n)
+    for start in range(0, n, step):
+        rows = np.arange(start, min(start + step, n))
+        scores = catalog.score(rows, changed)
+        scores[rows[:, None] == changed[None, :]] = -np.inf
+        threshold = thresholds[rows, None]
+        # Ties are broken by lower id, as in top_neighbors().
+        beats = (scores > threshold) | ((scores == threshold) & (changed_ids[None, :] < kth_ids[rows, None]))
+        dirty[rows] |= beats.any(axis=1)
+    return np.flatnonzero(dirty)
+
+
+def top_neighbors(catalog, rows, k):
+    """Positions and scores of the ``k`` best neighbors of each book in ``rows``.
+
+    Neighbors are ordered by descending score, ties going to the lower id,
+    so the result does not depend on which books were scored together.
+    """
+    scores = catalog.score(rows)
+    scores[np.arange(len(rows)), rows] = -np.inf
+    kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+    positions = np.empty((len(rows), k), dtype=np.int64)
+    for i, row_scores in enumerate(scores):
+        candidates = np.flatnonzero(row_scores >= kth[i])
+        order = np.argsort(-row_scores[candidates], kind='stable')[:k]
+        positions[i] = candidates[order]
+    return positions, np.take_along_axis(scores, positions, axis=1)
+
+
+def build(k=10, chunk_size=256, full=False):
+    """Refresh the neighbor table and return the number of books recomputed."""
+    catalog = Catalog.load()
+    n = len(catalog)
+    k_eff = min(k, n - 1)
+
+    known = dict(BookSimilarityState.objects.values_list('book_id', 'fingerprint'))
+    changed = np.array([
+        full or known.get(pk) != fingerprint
+        for pk, fingerprint in zip(catalog.ids.tolist(), catalog.fingerprints)
+    ], dtype=bool)
+    changed = np.flatnonzero(changed)
+    if full or len(changed) * 2 > n:
+        dirty = np.arange(n)
+    else:
+        dirty = find_dirty(catalog, k, changed)
+
+    changed_mask = np.zeros(n, dtype=bool)
+    changed_mask[changed] = True
+    step = chunk_rows(n, chunk_size)
+    for start in range(0, len(dirty), step):
+        rows = dirty[start:start + step]
+        book_ids = catalog.ids[rows].tolist()
+        neighbors = []
+        if k_eff > 0:
+            positions, scores = top_neighbors(catalog, rows, k_eff)
+            for book_id, row_positions, row_scores in zip(book_ids, positions, scores):
+                neighbors.extend(
+                    BookNeighbor(book_id=book_id, neighbor_id=int(catalog.ids[position]), rank=rank, score=float(score))
+                    for rank, (position, score) in enumerate(zip(row_positions, row_scores))
+                )
+        states = [
+            BookSimilarityState(book_id=int(catalog.ids[row]), fingerprint=catalog.fingerprints[row])
+            for row in rows if changed_mask[row]
+        ]
+        with transaction.atomic():
+            BookNeighbor.objects.filter(book_id__in=book_ids).delete()
+            BookNeighbor.objects.bulk_create(neighbors)
+            BookSimilarityState.objects.bulk_create(
+                states, update_conflicts=True,
+                unique_fields=['book'], update_fields=['fingerprint'],
+            )
+    return len(dirty)
@@ -0,0 +1,270 @@
+"""Pre-rendered catalog responses served straight from disk.
+
+``build`` renders the anonymous catalog pages every visitor sees, the full
+author, publisher and genre lists and the first pages of the book listing
+for each genre, through the real views. Each one is written to
+``CATALOG_SNAPSHOT_DIR`` as ``<shard>.json`` plus a gzipped copy. Files are
+swapped in with ``os.replace``, so readers see either the old or the new
+file, never a partial one.
+
+Model signals call ``invalidate`` on commit, which deletes the affected
+files so requests fall back to the dynamic views, and bumps each shard's
+generation. A build that sees a shard's generation move while it renders
+throws its file away, so rows read before a commit are never left on disk
+after that commit's invalidation. The builder also stores each shard's
+data version in ``manifest.json`` and re-renders only shards that are
+missing or whose version moved; a render that produces the same bytes
+leaves the file, and so its ETag, untouched. The manifest also carries the
+``Last-Modified`` time and, for the catalog lists, the ``X-Sync-Token``
+served with each snapshot.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import FileResponse, HttpRequest, HttpResponse, QueryDict
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from main import sync
+from main.models import Author, Book, Genre, Publisher, Tombstone
+
+LIST_SHARDS = ('author', 'publisher', 'genre')
+LISTING_PREFIX = 'book-listing'
+MANIFEST = 'manifest.json'
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+_manifest_cache = (None, {})
+
+
+def snapshot_dir():
+    return Path(settings.CATALOG_SNAPSHOT_DIR)
+
+
+def listing_pages():
+    return settings.CATALOG_SNAPSHOT_LISTING_PAGES
+
+
+def genre_slug(genre):
+    return hashlib.sha1(genre.encode()).hexdigest()[:16]
+
+
+def listing_shard(genre, page):
+    return f'{LISTING_PREFIX}/{genre_slug(genre)}/{page}'
+
+
+def listing_shard_for(params):
+    """Shard key for a book listing query, or ``None`` if it is not snapshotted."""
+    if not params.get('genre') or set(params) - {'genre', 'page'}:
+        return None
+    page = params.get('page', '1')
+    if not page.isdigit() or not 1 <= int(page) <= listing_pages():
+        return None
+    return listing_shard(params['genre'], int(page))
+
+
+def manifest():
+    """The build manifest, re-read only when the file has been replaced."""
+    global _manifest_cache
+    path = snapshot_dir() / MANIFEST
+    try:
+        st = os.stat(path)
+        key = (str(path), st.st_ino, st.st_mtime_ns, st.st_size)
+        if _manifest_cache[0] != key:
+            _manifest_cache = (key, json.loads(path.read_bytes()))
+    except (FileNotFoundError, ValueError):
+        return {}
+    return _manifest_cache[1]
+
+
+def serve(request, shard):
+    """Response for ``shard`` from disk, or ``None`` if it has no snapshot."""
+    entry = manifest().get(shard)
+    if entry is None:
+        return None
+    gzipped = bool(_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    name = f'{shard}.json.gz' if gzipped else f'{shard}.json'
+    try:
+        f = open(snapshot_dir() / name, 'rb')
+    except FileNotFoundError:
+        return None
+
+    # Stat the open file so the ETag always describes the bytes being sent.
+    st = os.fstat(f.fileno())
+    etag = quote_etag(f'{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}')
+    last_modified = entry.get('last_modified')
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        f.close()
+    elif settings.CATALOG_SNAPSHOT_SENDFILE_HEADER:
+        f.close()
+        root = settings.CATALOG_SNAPSHOT_SENDFILE_ROOT or f'{snapshot_dir()}/'
+        response = HttpResponse(content_type='application/json')
+        response[settings.CATALOG_SNAPSHOT_SENDFILE_HEADER] = f'{root}{name}'
+    else:
+        response = FileResponse(f, content_type='application/json')
+        del response['Content-Disposition']
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # The token predates the render, so a delta from it may repeat rows but never misses one.
+    if entry.get('sync_token'):
+        response['X-Sync-Token'] = entry['sync_token']
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+
+def _remove(shard):
+    for suffix in ('.json', '.json.gz'):
+        try:
+            os.remove(snapshot_dir() / f'{shard}{suffix}')
+        except FileNotFoundError:
+            pass
+
+
+def _generation(shard):
+    try:
+        return (snapshot_dir() / f'{shard}.generation').read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def invalidate(lists=(), genres=()):
+    """Delete the snapshots of the given list shards and of every listing page of ``genres``."""
+    if not snapshot_dir().is_dir():
+        return
+    shards = [*lists, *(listing_shard(genre, page) for genre in genres for page in range(1, listing_pages() + 1))]
+    for shard in shards:
+        _write_atomic(snapshot_dir() / f'{shard}.generation', uuid.uuid4().hex.encode())
+        _remove(shard)
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _render(view, path, params=None):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict(mutable=True)
+    request.GET.update({key: str(value) for key, value in (params or {}).items()})
+    request.META = {
+        'HTTP_ACCEPT': 'application/json',
+        'QUERY_STRING': request.GET.urlencode(),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+    }
+    response = view(request)
+    response.render()
+    return response.content if response.status_code == 200 else None
+
+
+def _shard_versions():
+    """Data versions of the list shards and of each genre's listing pages."""
+    lists = {
+        shard: sync.last_modified(model)
+        for shard, model in zip(LIST_SHARDS, (Author, Publisher, Genre))
+    }
+    shared = [
+        sync.last_modified(Author, Publisher),
+        Tombstone.objects.filter(model='book').aggregate(latest=Max('deleted_at'))['latest'],
+    ]
+    genres = {}
+    for genre, latest in Book.objects.values('genre').annotate(latest=Max('updated_at')).values_list('genre', 'latest'):
+        if genre:
+            genres[genre] = max(moment for moment in [latest, *shared] if moment is not None)
+    return lists, genres
+
+
+def _jobs():
+    """``{shard: (version, view, path, params)}`` for every shard that should exist."""
+    from main import views
+
+    list_versions, genre_versions = _shard_versions()
+    list_views = {'author': views.AuthorView, 'publisher': views.PublisherView, 'genre': views.GenreView}
+    jobs = {
+        shard: (version, list_views[shard].as_view(serve_snapshots=False), reverse(shard), None)
+        for shard, version in list_versions.items()
+    }
+    listing_view = views.BookListingView.as_view(serve_snapshots=False)
+    for genre, version in genre_versions.items():
+        for page in range(1, listing_pages() + 1):
+            jobs[listing_shard(genre, page)] = (version, listing_view, reverse('book-listing'), {'genre': genre, 'page': page})
+    return jobs
+
+
+def build(force=False):
+    """Render missing or outdated snapshots; returns ``(written, removed)`` shard counts."""
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        old_manifest = json.loads((directory / MANIFEST).read_text())
+    except (FileNotFoundError, ValueError):
+        old_manifest = {}
+
+    jobs = _jobs()
+    # Re-render list shards well before their sync token falls out of the tombstone window.
+    renew_tokens_before = int(sync.encode_token(timezone.now() - sync.tombstone_retention() / 2))
+    written = removed = 0
+    new_manifest = {}
+    for shard, (moment, view, path, params) in jobs.items():
+        version = moment.isoformat() if moment else ''
+        entry = old_manifest.get(shard, {})
+        on_disk = (directory / f'{shard}.json').exists() and (directory / f'{shard}.json.gz').exists()
+        token_expiring = params is None and int(entry.get('sync_token') or 0) < renew_tokens_before
+        if on_disk and entry.get('version') == version and not token_expiring and not force:
+            new_manifest[shard] = entry
+            continue
+
+        generation = _generation(shard)
+        sync_token = sync.issue_token() if params is None else None
+        content = _render(view, path, params)
+        if content is None or (params and params['page'] > 1 and not json.loads(content)['results']):
+            if on_disk:
+                _remove(shard)
+                removed += 1
+            continue
+        digest = hashlib.sha1(content).hexdigest()
+        if not (on_disk and entry.get('digest') == digest):
+            if _generation(shard) != generation:
+                continue
+            _write_atomic(directory / f'{shard}.json', content)
+            _write_atomic(directory / f'{shard}.json.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if _generation(shard) != generation:
+                # Invalidated while these files were being swapped in; they may hold old rows.
+                _remove(shard)
+                continue
+            written += 1
+        new_manifest[shard] = {
+            'version': version,
+            'digest': digest,
+            'last_modified': int(moment.timestamp()) if moment else None,
+            'sync_token': sync_token,
+        }
+
+    for shard in set(old_manifest) - set(new_manifest):
+        if shard not in jobs:
+            _remove(shard)
+            removed += 1
+    _write_atomic(directory / MANIFEST, json.dumps(new_manifest, indent=1, sort_keys=True).encode())
+    return written, removed
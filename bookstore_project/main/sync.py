@@ -0,0 +1,113 @@
+"""Change tracking helpers for incremental catalog sync.
+
+Sync tokens are opaque to clients: they encode a moment as integer
+microseconds since the epoch. ``updated_at`` is stamped when a row is
+written, not when its transaction commits, so a token is issued
+``SYNC_COMMIT_WINDOW`` behind the current time. Rows from transactions
+that were still open when the token was issued are then sent on the next
+delta; rows inside the window may be sent twice, which clients must
+tolerate.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from main.models import CatalogVersion, Tombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+class ExpiredSyncToken(InvalidSyncToken):
+    pass
+
+
+def tombstone_retention():
+    return getattr(settings, 'SYNC_TOMBSTONE_RETENTION', timedelta(days=30))
+
+
+def commit_window():
+    return getattr(settings, 'SYNC_COMMIT_WINDOW', timedelta(minutes=5))
+
+
+def encode_token(moment):
+    delta = moment - EPOCH
+    return str((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def issue_token():
+    """Token for a list or delta computed now, trailing by the commit window."""
+    return encode_token(timezone.now() - commit_window())
+
+
+def decode_token(token):
+    try:
+        micros = int(token)
+        if micros < 0:
+            raise ValueError
+        moment = EPOCH + timedelta(microseconds=micros)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidSyncToken(f"Malformed sync token: {token!r}")
+    if moment < timezone.now() - tombstone_retention():
+        raise ExpiredSyncToken(f"Sync token is older than the tombstone retention window: {token!r}")
+    return moment
+
+
+def changes_since(queryset, since, related=()):
+    """Return ``(changed_queryset, deleted_ids)`` for rows touched after ``since``.
+
+    Rows whose ``related`` foreign keys point at objects changed after
+    ``since`` count as changed too, since their expanded form differs.
+    """
+    model_name = queryset.model._meta.model_name
+    condition = Q(updated_at__gt=since)
+    for name in related:
+        condition |= Q(**{f'{name}__updated_at__gt': since})
+    changed = queryset.filter(condition)
+    deleted = list(
+        Tombstone.objects
+        .filter(model=model_name, deleted_at__gt=since)
+        .values_list('object_id', flat=True)
+        .distinct()
+    )
+    return changed, deleted
+
+
+def last_modified(*models):
+    """Latest insert, update or delete across ``models``, or ``None`` if all are empty."""
+    moments = []
+    for model in models:
+        moments.append(model.objects.aggregate(latest=Max('updated_at'))['latest'])
+    moments.append(
+        Tombstone.objects
+        .filter(model__in=[model._meta.model_name for model in models])
+        .aggregate(latest=Max('deleted_at'))['latest']
+    )
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def bump_versions(*models):
+    """Advance the change counters of ``models``; call inside the writing transaction."""
+    names = sorted({model._meta.model_name for model in models})
+    if CatalogVersion.objects.filter(model__in=names).update(version=F('version') + 1) < len(names):
+        CatalogVersion.objects.bulk_create([CatalogVersion(model=name, version=1) for name in names], ignore_conflicts=True)
+
+
+def versions(*models):
+    """``"name:version,..."`` for ``models``: changes whenever a write to any of them commits."""
+    names = [model._meta.model_name for model in models]
+    counters = dict(CatalogVersion.objects.filter(model__in=names).values_list('model', 'version'))
+    return ','.join(f'{name}:{counters.get(name, 0)}' for name in names)
+
+
+def prune_tombstones(older_than=None):
+    if older_than is None:
+        older_than = timezone.now() - tombstone_retention()
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=older_than).delete()
+    return deleted
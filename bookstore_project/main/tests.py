@@ -1,3 +1,714 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.paginator import EmptyPage
+from django.db import OperationalError, connection
+from django.db.models.deletion import Collector
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main import inventory, listings, pricing, snapshots, sync, typeahead
+from main.models import BookListing, BookNeighbor, PriceChange, Reservation, Tombstone
+from main.signals import books_repriced
+from main.renderers import DECIMAL_EXT_TYPE, msgpack
+from main.models import Author, Publisher, Book
+from main.paginators import EstimatedCountPaginator
+from main.views import BookListingView
+
+
+class CatalogSyncTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Ursula K. Le Guin')
+        self.publisher = Publisher.objects.create(name='Ace')
+        self.book = Book.objects.create(
+            name='The Left Hand of Darkness', author=self.author,
+            publisher=self.publisher, price=Decimal('12.50'), genre='Science Fiction',
+        )
+
+    def test_full_list_carries_validators(self):
+        response = self.client.get(reverse('book'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('X-Sync-Token', response)
+
+    def test_unchanged_list_returns_304(self):
+        etag = self.client.get(reverse('book'))['ETag']
+        response = self.client.get(reverse('book'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.book.price = Decimal('10.00')
+        self.book.save()
+        response = self.client.get(reverse('book'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SYNC_COMMIT_WINDOW=timedelta(0))
+    def test_delta_returns_changes_and_deletions(self):
+        token = self.client.get(reverse('book'))['X-Sync-Token']
+        other = Book.objects.create(
+            name='The Dispossessed', author=self.author,
+            publisher=self.publisher, price=Decimal('11.00'), genre='Science Fiction',
+        )
+        deleted_pk = self.book.pk
+        self.book.delete()
+
+        response = self.client.get(reverse('book'), {'since': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [other.pk])
+        self.assertEqual(response.data['deleted'], [deleted_pk])
+
+        response = self.client.get(reverse('book'), {'since': response.data['sync_token']})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_publisher_deletion_marks_books_changed(self):
+        token = sync.encode_token(timezone.now())
+        self.publisher.delete()
+        response = self.client.get(reverse('book'), {'since': token})
+        self.assertEqual(response.data['results'][0]['publisher'], None)
+
+    def test_late_commit_with_older_timestamp_changes_etag(self):
+        Book.objects.create(name='Lavinia', author=self.author, price=Decimal('13.00'), genre='Fantasy')
+        first = self.client.get(reverse('book'))
+        # A transaction that stamped its row before the last fetch but committed after it.
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(minutes=1)):
+            self.book.name = 'The Word for World Is Forest'
+            self.book.save()
+        response = self.client.get(reverse('book'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('The Word for World Is Forest', [row['name'] for row in response.data])
+
+    def test_tombstones_leave_fast_delete_on_for_other_models(self):
+        collector = Collector('default')
+        self.assertTrue(collector.can_fast_delete(Tombstone.objects.all()))
+        self.assertTrue(collector.can_fast_delete(BookNeighbor.objects.all()))
+        self.assertFalse(collector.can_fast_delete(Book.objects.all()))
+
+    def test_rows_committed_after_token_reach_next_delta(self):
+        token = self.client.get(reverse('book'))['X-Sync-Token']
+        # A write stamped before the token was issued but committed after it.
+        Book.objects.filter(pk=self.book.pk).update(price=Decimal('8.00'), updated_at=timezone.now() - timedelta(seconds=30))
+        response = self.client.get(reverse('book'), {'since': token})
+        self.assertEqual([row['price'] for row in response.data['results']], ['8.00'])
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get(reverse('book'), {'since': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('book'), {'since': '9' * 30}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('book'), {'since': '1'}).status_code, 410)
+
+
+class QueryShapeTests(TestCase):
+    def setUp(self):
+        publisher = Publisher.objects.create(name='Tor')
+        for i in range(5):
+            author = Author.objects.create(name=f'Author {i}')
+            Book.objects.create(
+                name=f'Book {i}', author=author, publisher=publisher,
+                price=Decimal('9.99'), genre='Fantasy',
+            )
+
+    def test_fields_trim_payload(self):
+        response = self.client.get(reverse('book'), {'fields': 'name,price'})
+        self.assertEqual(set(response.data[0]), {'name', 'price'})
+
+    def test_expand_inlines_related_without_per_row_queries(self):
+        with self.assertNumQueries(6):
+            # one for the ETag versions, four for Last-Modified, one for the joined list
+            response = self.client.get(reverse('book'), {'fields': 'name', 'expand': 'author,publisher'})
+        self.assertEqual(set(response.data[0]), {'name', 'author', 'publisher'})
+        self.assertEqual(response.data[0]['author']['name'], 'Author 0')
+        self.assertEqual(response.data[0]['publisher']['name'], 'Tor')
+
+    def test_unknown_field_or_expansion_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('book'), {'fields': 'isbn'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('book'), {'expand': 'genre'}).status_code, 400)
+
+
+class ResponseFormatTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(name='Octavia E. Butler')
+        Book.objects.create(name='Kindred', author=author, price=Decimal('15.05'), genre='Fiction')
+        Book.objects.create(name='Dawn', author=author, price=Decimal('9.10'), genre='Science Fiction')
+
+    def test_columnar_layout_scales_prices_losslessly(self):
+        response = self.client.get(reverse('book'), {'format': 'columnar'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.bookstore.columnar+json')
+        body = response.json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual(body['data']['name'], ['Kindred', 'Dawn'])
+        self.assertEqual(body['data']['price'], [1505, 910])
+        self.assertEqual(body['scale'], {'price': 2})
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_messagepack_carries_decimal_ext_type(self):
+        def ext_hook(code, payload):
+            self.assertEqual(code, DECIMAL_EXT_TYPE)
+            return Decimal(payload.decode('ascii'))
+
+        response = self.client.get(reverse('book'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        rows = msgpack.unpackb(response.content, ext_hook=ext_hook)
+        self.assertEqual([row['price'] for row in rows], [Decimal('15.05'), Decimal('9.10')])
+
+    def test_etag_depends_on_format(self):
+        json_etag = self.client.get(reverse('book'))['ETag']
+        response = self.client.get(reverse('book'), {'format': 'columnar'}, HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(find_spec('numpy'), "numpy is not installed")
+class SimilarBooksTests(TestCase):
+    def setUp(self):
+        self.le_guin = Author.objects.create(name='Ursula K. Le Guin')
+        self.butler = Author.objects.create(name='Octavia E. Butler')
+        self.books = [
+            Book.objects.create(name='A Wizard of Earthsea', author=self.le_guin, price=Decimal('10.00'), genre='Fantasy'),
+            Book.objects.create(name='The Tombs of Atuan', author=self.le_guin, price=Decimal('11.00'), genre='Fantasy'),
+            Book.objects.create(name='Kindred', author=self.butler, price=Decimal('30.00'), genre='Fiction'),
+            Book.objects.create(name='Fledgling', author=self.butler, price=Decimal('12.00'), genre='Fantasy'),
+        ]
+        poet = Author.objects.create(name='Mary Oliver')
+        for i in range(4):
+            Book.objects.create(name=f'Poems {i}', author=poet, price=Decimal('90.00'), genre='Poetry')
+
+    def build(self, **kwargs):
+        from main import similarity
+        return similarity.build(k=2, **kwargs)
+
+    def test_read_endpoint_returns_ranked_neighbors(self):
+        self.build()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('book-similar', args=[self.books[0].pk]))
+        self.assertEqual([row['name'] for row in response.data], ['The Tombs of Atuan', 'Fledgling'])
+
+    def test_rebuild_touches_only_affected_books(self):
+        self.assertEqual(self.build(), 8)
+        self.assertEqual(self.build(), 0)
+
+        kindred = self.books[2]
+        kindred.genre = 'Fantasy'
+        kindred.price = Decimal('10.50')
+        kindred.save()
+        self.assertLess(self.build(), 8)
+        incremental = set(BookNeighbor.objects.values_list('book_id', 'rank', 'neighbor_id'))
+        self.build(full=True)
+        self.assertEqual(incremental, set(BookNeighbor.objects.values_list('book_id', 'rank', 'neighbor_id')))
+
+    def test_unknown_book_is_404(self):
+        self.assertEqual(self.client.get(reverse('book-similar', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('book-similar', args=[10**20])).status_code, 404)
+
+
+class RepricingTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Terry Pratchett')
+        self.publisher = Publisher.objects.create(name='Gollancz')
+        self.books = [
+            Book.objects.create(
+                name=f'Discworld {i}', author=self.author, publisher=self.publisher,
+                price=Decimal('10.00') + i, genre='Fantasy' if i % 2 else 'Humour',
+            )
+            for i in range(6)
+        ]
+
+    def test_rule_reprices_in_a_bounded_number_of_statements(self):
+        received = []
+
+        def receiver(sender, book_ids, **kwargs):
+            received.extend(book_ids)
+
+        books_repriced.connect(receiver)
+        self.addCleanup(books_repriced.disconnect, receiver)
+        # savepoint, batch insert, select, update, audit insert, empty select, count update, version bump, release
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(9):
+            batch = pricing.reprice_by_rule('25', genre='Fantasy', reason='Summer sale')
+        self.assertEqual(batch.changed_count, 3)
+        self.assertEqual(
+            list(Book.objects.filter(genre='Fantasy').order_by('pk').values_list('price', flat=True)),
+            [Decimal('8.25'), Decimal('9.75'), Decimal('11.25')],
+        )
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).price, Decimal('10.00'))
+        self.assertEqual(sorted(received), [book.pk for book in self.books if book.genre == 'Fantasy'])
+
+    def test_map_records_audit_and_is_all_or_nothing(self):
+        batch = pricing.reprice_by_map({str(self.books[0].pk): '7.99'})
+        change = PriceChange.objects.get(batch=batch)
+        self.assertEqual((change.old_price, change.new_price), (Decimal('10.00'), Decimal('7.99')))
+
+        with self.assertRaises(pricing.RepricingError):
+            pricing.reprice_by_map({self.books[1].pk: '1.00', 999: '1.00'})
+        self.assertEqual(Book.objects.get(pk=self.books[1].pk).price, Decimal('11.00'))
+        with self.assertRaises(pricing.RepricingError):
+            pricing.reprice_by_map({'99999999999999999999': '1.00'})
+
+    def test_endpoint_requires_admin(self):
+        payload = {'rule': {'percent_off': '10', 'genre': 'Humour'}}
+        response = self.client.post(reverse('book-reprice'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(reverse('book-reprice'), payload, content_type='application/json')
+        self.assertEqual(response.data['changed'], 3)
+
+    def test_endpoint_rejects_out_of_range_ids(self):
+        staff = get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        for payload in (
+            {'prices': {'99999999999999999999': '1.00'}},
+            {'rule': {'percent_off': '10', 'publisher': 99999999999999999999}},
+            {'rule': {'percent_off': '10', 'author': 0}},
+        ):
+            response = self.client.post(reverse('book-reprice'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(name='N. K. Jemisin')
+        self.fifth = Book.objects.create(name='The Fifth Season', author=author, price=Decimal('14.00'), genre='Fantasy', stock=3)
+        self.gate = Book.objects.create(name='The Obelisk Gate', author=author, price=Decimal('14.00'), genre='Fantasy', stock=1)
+
+    def stock(self, book):
+        return Book.objects.get(pk=book.pk).stock
+
+    def test_multi_book_reservation_is_all_or_nothing(self):
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.reserve([(self.fifth.pk, 2), (self.gate.pk, 2)])
+        self.assertEqual((self.stock(self.fifth), self.stock(self.gate)), (3, 1))
+
+        inventory.reserve([(self.fifth.pk, 2), (self.gate.pk, 1)])
+        self.assertEqual((self.stock(self.fifth), self.stock(self.gate)), (1, 0))
+
+    def test_release_and_confirm(self):
+        held = inventory.reserve([(self.fifth.pk, 2)])
+        self.assertTrue(inventory.release(held.pk))
+        self.assertFalse(inventory.release(held.pk))
+        self.assertEqual(self.stock(self.fifth), 3)
+
+        sold = inventory.reserve([(self.fifth.pk, 2)])
+        self.assertTrue(inventory.confirm(sold.pk))
+        self.assertFalse(inventory.release(sold.pk))
+        self.assertEqual(self.stock(self.fifth), 1)
+
+    def test_sweeper_releases_only_expired_holds(self):
+        expired = inventory.reserve([(self.fifth.pk, 1)], ttl=timedelta(seconds=-1))
+        active = inventory.reserve([(self.fifth.pk, 1)])
+        self.assertEqual(inventory.release_expired(), 1)
+        self.assertEqual(Reservation.objects.get(pk=expired.pk).status, Reservation.EXPIRED)
+        self.assertEqual(Reservation.objects.get(pk=active.pk).status, Reservation.ACTIVE)
+        self.assertEqual(self.stock(self.fifth), 2)
+        self.assertFalse(inventory.confirm(expired.pk))
+
+    def test_saving_a_stale_book_keeps_reserved_stock(self):
+        stale = Book.objects.get(pk=self.fifth.pk)
+        inventory.reserve([(self.fifth.pk, 2)])
+        stale.name = 'The Fifth Season (reissue)'
+        stale.save()
+        self.assertEqual(self.stock(self.fifth), 1)
+
+        admin_user = get_user_model().objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin_user)
+        url = reverse('admin:main_book_change', args=[self.fifth.pk])
+        publisher = Publisher.objects.create(name='Orbit')
+        inventory.reserve([(self.fifth.pk, 1)])
+        response = self.client.post(url, {
+            'name': 'The Fifth Season', 'author': self.fifth.author_id, 'publisher': publisher.pk,
+            'price': '14.00', 'genre': 'Fantasy', 'stock': '3',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Book.objects.get(pk=self.fifth.pk).name, 'The Fifth Season')
+        self.assertEqual(self.stock(self.fifth), 0)
+
+    def test_restock(self):
+        inventory.restock(self.gate.pk, 4)
+        self.assertEqual(self.stock(self.gate), 5)
+        with self.assertRaises(inventory.OutOfStock):
+            inventory.restock(self.gate.pk, -6)
+        inventory.restock(self.gate.pk, -5)
+        self.assertEqual(self.stock(self.gate), 0)
+        with self.assertRaises(inventory.UnknownBook):
+            inventory.restock(self.gate.pk + 100, 1)
+
+    def auth(self, username):
+        user = get_user_model().objects.create_user(username, password='pw')
+        credentials = base64.b64encode(f'{username}:pw'.encode()).decode()
+        return user, {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def test_endpoint_reports_conflict(self):
+        _, auth = self.auth('reader')
+        response = self.client.post(
+            reverse('reservations'), {'items': [{'book': self.gate.pk, 'quantity': 2}]}, content_type='application/json', **auth,
+        )
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(
+            reverse('reservations'), {'items': [{'book': 999999, 'quantity': 1}]}, content_type='application/json', **auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('reservations'), {'items': [{'book': self.gate.pk, 'quantity': 1}]}, content_type='application/json', **auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['items'], [{'book': self.gate.pk, 'quantity': 1}])
+
+    def test_only_the_owner_can_use_a_reservation(self):
+        owner, owner_auth = self.auth('owner')
+        _, other_auth = self.auth('other')
+        held = inventory.reserve([(self.fifth.pk, 1)], user=owner)
+        anonymous = self.client.post(
+            reverse('reservations'), {'items': [{'book': self.fifth.pk, 'quantity': 2}]}, content_type='application/json',
+        )
+        self.assertIn(anonymous.status_code, (401, 403))
+        for method, name in (('get', 'reservation-detail'), ('delete', 'reservation-detail'), ('post', 'reservation-confirm')):
+            response = getattr(self.client, method)(reverse(name, args=[held.pk]), **other_auth)
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stock(self.fifth), 2)
+        self.assertEqual(self.client.get(reverse('reservation-detail', args=[held.pk]), **owner_auth).status_code, 200)
+        self.assertEqual(self.client.delete(reverse('reservation-detail', args=[held.pk]), **owner_auth).status_code, 204)
+        self.assertEqual(self.stock(self.fifth), 3)
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    THREADS = 24
+    ATTEMPTS = 10
+    STOCK = 50
+
+    def test_hot_book_is_never_oversold(self):
+        author = Author.objects.create(name='Brandon Sanderson')
+        book = Book.objects.create(name='Wind and Truth', author=author, price=Decimal('35.00'), genre='Fantasy', stock=self.STOCK)
+        reserved, errors = [], []
+        start = threading.Barrier(self.THREADS)
+
+        def buyer():
+            start.wait()
+            try:
+                for _ in range(self.ATTEMPTS):
+                    while True:
+                        try:
+                            inventory.reserve([(book.pk, 1)])
+                        except inventory.OutOfStock:
+                            pass
+                        except OperationalError:
+                            # SQLite reports lock contention instead of waiting; retry.
+                            continue
+                        else:
+                            reserved.append(1)
+                        break
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(reserved), self.STOCK)
+        self.assertEqual(Book.objects.get(pk=book.pk).stock, 0)
+        self.assertEqual(Reservation.objects.count(), self.STOCK)
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(typeahead, 'index', typeahead.PrefixIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tolkien = Author.objects.create(name='J. R. R. Tolkien')
+        self.tor = Publisher.objects.create(name='Tor Books')
+        Book.objects.create(name='The Hobbit', author=self.tolkien, price=Decimal('9.00'), genre='Fantasy')
+        Book.objects.create(name='The Silmarillion', author=self.tolkien, price=Decimal('12.00'), genre='Fantasy')
+
+    def suggest(self, q):
+        return self.client.get(reverse('typeahead'), {'q': q}).data
+
+    def test_matches_word_prefixes_without_queries_once_built(self):
+        self.assertEqual(self.suggest('tolk'), [{'type': 'author', 'id': self.tolkien.pk, 'name': 'J. R. R. Tolkien'}])
+        with self.assertNumQueries(0):
+            names = [row['name'] for row in self.suggest('t')]
+        # The author has two books, so it outranks the unreferenced publisher and the books.
+        self.assertEqual(names[0], 'J. R. R. Tolkien')
+        self.assertEqual(set(names), {'J. R. R. Tolkien', 'Tor Books', 'The Hobbit', 'The Silmarillion'})
+
+    def test_signals_keep_index_current(self):
+        self.suggest('x')
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(name='Tales from Earthsea', author=self.tolkien, publisher=self.tor, price=Decimal('8.00'), genre='Fantasy')
+        self.assertEqual([row['id'] for row in self.suggest('earth')], [book.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.name = 'Tehanu'
+            book.save()
+        self.assertEqual(self.suggest('earth'), [])
+        self.assertEqual(self.suggest('tehanu')[0]['id'], book.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(self.suggest('tehanu'), [])
+
+    def test_confirmed_sales_reorder_books(self):
+        silmarillion = Book.objects.get(name='The Silmarillion')
+        Book.objects.filter(pk=silmarillion.pk).update(stock=2)
+        self.assertEqual(self.suggest('the')[0]['name'], 'The Hobbit')
+        held = inventory.reserve([(silmarillion.pk, 2)])
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.confirm(held.pk)
+        self.assertEqual(self.suggest('the')[0]['name'], 'The Silmarillion')
+
+    @override_settings(TYPEAHEAD_MAX_AGE=timedelta(minutes=1))
+    def test_index_is_rebuilt_in_the_background_once_too_old(self):
+        self.suggest('x')
+        Book.objects.filter(name='The Hobbit').update(name='There and Back Again')
+        self.assertEqual(self.suggest('there'), [])
+        typeahead.index.built_at -= 120
+        with mock.patch.object(typeahead.threading, 'Thread') as thread:
+            # Requests keep being answered from the old copy and start one rebuild.
+            with self.assertNumQueries(0):
+                self.assertEqual(self.suggest('there'), [])
+                self.assertEqual(self.suggest('there'), [])
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
+        thread.call_args.kwargs['target']()
+        self.assertEqual([row['name'] for row in self.suggest('there')], ['There and Back Again'])
+
+    def test_rebuild_keeps_updates_made_while_it_loads(self):
+        index = typeahead.index
+        load = index._load
+
+        def racing_load():
+            loaded = load()
+            index.upsert(typeahead.AUTHOR, self.tolkien.pk, 'John Ronald Reuel Tolkien')
+            return loaded
+
+        with mock.patch.object(index, '_load', racing_load):
+            index.build()
+        self.assertEqual([row['name'] for row in index.search('ronald')], ['John Ronald Reuel Tolkien'])
+        self.assertEqual(index.search('j r r'), [])
+
+
+class BookListingTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Iain M. Banks')
+        self.publisher = Publisher.objects.create(name='Orbit')
+        self.books = [
+            Book.objects.create(
+                name=name, author=self.author, publisher=self.publisher,
+                price=Decimal(price), genre='Science Fiction',
+            )
+            for name, price in (('Excession', '9.99'), ('Consider Phlebas', '8.99'), ('Use of Weapons', '10.99'))
+        ]
+
+    def test_listing_follows_source_changes(self):
+        self.author.name = 'Iain Banks'
+        self.author.save()
+        self.books[0].genre = 'Space Opera'
+        self.books[0].save()
+        with self.captureOnCommitCallbacks(execute=True):
+            pricing.reprice_by_map({self.books[1].pk: '5.00'})
+        self.publisher.delete()
+
+        listing = BookListing.objects.get(pk=self.books[0].pk)
+        self.assertEqual((listing.author_name, listing.genre, listing.publisher_name), ('Iain Banks', 'Space Opera', None))
+        self.assertEqual(BookListing.objects.get(pk=self.books[1].pk).price, Decimal('5.00'))
+        self.assertEqual(listings.check(), ([], []))
+
+    def test_check_reports_and_fixes_drift(self):
+        Book.objects.filter(pk=self.books[0].pk).update(price=Decimal('1.00'))
+        BookListing.objects.filter(pk=self.books[1].pk).delete()
+        self.assertEqual(listings.check(fix=True), ([self.books[1].pk], [self.books[0].pk]))
+        self.assertEqual(listings.check(), ([], []))
+
+    def test_endpoint_filters_sorts_and_pages_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('book-listing'), {'genre': 'Science Fiction', 'sort': '-price', 'page_size': 2})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Use of Weapons', 'Excession'])
+        self.assertEqual(response.data['results'][0]['author_name'], 'Iain M. Banks')
+        self.assertTrue(response.data['has_next'])
+
+        response = self.client.get(reverse('book-listing'), {'max_price': '9.00'})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Consider Phlebas'])
+        self.assertEqual(self.client.get(reverse('book-listing'), {'sort': 'isbn'}).status_code, 400)
+
+    def test_title_filter_and_sorts_are_served_by_indexes(self):
+        response = self.client.get(reverse('book-listing'), {'title': 'CONSIDER'})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Consider Phlebas'])
+        if connection.vendor != 'sqlite':
+            return
+        view = BookListingView()
+        for params, ordering in (({'title': 'use'}, 'name'), ({'genre': 'Science Fiction'}, '-price'), ({'author': '1'}, 'name')):
+            queryset = BookListing.objects.filter(view.get_filters(params)).order_by(*view.sort_orders[ordering])
+            plan = queryset.explain()
+            self.assertNotIn('SCAN main_booklisting', plan)
+            if 'title' not in params:
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_out_of_range_values_are_rejected(self):
+        for params in ({'min_price': 'NaN'}, {'max_price': 'Infinity'}, {'page': '1' + '0' * 22}, {'author': '9' * 25}):
+            self.assertEqual(self.client.get(reverse('book-listing'), params).status_code, 400, params)
+
+
+class MiddlewareProfileTests(TestCase):
+    def test_api_routes_skip_stateful_middleware(self):
+        response = self.client.get(reverse('genre'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def test_admin_keeps_full_stack(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', response.cookies)
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Ann Leckie')
+        self.other = Author.objects.create(name='Martha Wells')
+        self.publisher = Publisher.objects.create(name='Orbit')
+        self.books = [
+            Book.objects.create(name=name, author=self.author, publisher=self.publisher, price=Decimal('15.00'), genre='Science Fiction')
+            for name in ('Ancillary Justice', 'Ancillary Sword', 'Ancillary Mercy')
+        ]
+
+    def test_ids_filter_keeps_request_order_and_dedupes(self):
+        ids = f'{self.books[2].pk},{self.books[0].pk},{self.books[2].pk},999'
+        response = self.client.get(reverse('book'), {'ids': ids, 'expand': 'author'})
+        self.assertEqual([row['id'] for row in response.data], [self.books[2].pk, self.books[0].pk])
+        self.assertEqual(response.data[0]['author']['name'], 'Ann Leckie')
+
+    def test_ids_are_validated_and_capped(self):
+        self.assertEqual(self.client.get(reverse('book'), {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('book'), {'ids': '9' * 23}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('batch'), {'authors': '0'}).status_code, 400)
+        too_many = ','.join(str(pk) for pk in range(1, 102))
+        self.assertEqual(self.client.get(reverse('book'), {'ids': too_many}).status_code, 400)
+
+    def test_combined_batch_resolves_related_in_one_query_per_model(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('batch'), {
+                'books': f'{self.books[1].pk},{self.books[0].pk},999',
+                'authors': str(self.other.pk),
+            })
+        self.assertEqual([row['name'] for row in response.data['books']], ['Ancillary Sword', 'Ancillary Justice'])
+        self.assertEqual([row['name'] for row in response.data['authors']], ['Martha Wells', 'Ann Leckie'])
+        self.assertEqual([row['name'] for row in response.data['publishers']], ['Orbit'])
+        self.assertEqual(response.data['missing'], {'books': [999], 'authors': [], 'publishers': []})
+
+    def test_columnar_batch_keeps_prices_exact(self):
+        response = self.client.get(reverse('batch'), {'books': str(self.books[0].pk)}, HTTP_ACCEPT='application/vnd.bookstore.columnar+json')
+        body = json.loads(response.content)
+        self.assertEqual(body['books']['data']['price'], [1500])
+        self.assertEqual(body['books']['scale'], {'price': 2})
+        self.assertEqual(body['authors']['data']['name'], ['Ann Leckie'])
+        self.assertEqual(body['missing'], {'books': [], 'authors': [], 'publishers': []})
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(CATALOG_SNAPSHOT_DIR=directory.name, CATALOG_SNAPSHOT_LISTING_PAGES=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        author = Author.objects.create(name='Robin Hobb')
+        publisher = Publisher.objects.create(name='Voyager')
+        self.book = Book.objects.create(name="Assassin's Apprentice", author=author, publisher=publisher, price=Decimal('9.99'), genre='Fantasy', stock=5)
+        Book.objects.create(name='Dracula', author=author, publisher=publisher, price=Decimal('5.00'), genre='Horror')
+        self.assertEqual(snapshots.build(), (5, 0))
+
+    def test_serves_gzipped_snapshot_with_etag(self):
+        dynamic = self.client.get(reverse('author'), {'format': 'json'})
+        response = self.client.get(reverse('author'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(b''.join(response.streaming_content))), json.loads(dynamic.content))
+        not_modified = self.client.get(reverse('author'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_snapshot_carries_sync_token_and_last_modified(self):
+        dynamic = self.client.get(reverse('author'), {'format': 'json'})
+        response = self.client.get(reverse('author'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Last-Modified'], dynamic['Last-Modified'])
+        with self.captureOnCommitCallbacks(execute=True):
+            author = Author.objects.create(name='Megan Lindholm')
+        delta = self.client.get(reverse('author'), {'since': response['X-Sync-Token']})
+        self.assertIn(author.pk, [row['id'] for row in delta.data['results']])
+
+    def test_build_discards_shard_invalidated_while_rendering(self):
+        render = snapshots._render
+
+        def render_then_invalidate(view, path, params=None):
+            content = render(view, path, params)
+            snapshots.invalidate(lists=['author'])
+            return content
+
+        snapshots.invalidate(lists=['author'])
+        with mock.patch.object(snapshots, '_render', render_then_invalidate):
+            snapshots.build()
+        self.assertFalse(self.client.get(reverse('author')).streaming)
+        self.assertEqual(snapshots.build(), (1, 0))
+        self.assertTrue(self.client.get(reverse('author')).streaming)
+
+    def test_only_default_listing_pages_are_snapshots(self):
+        self.assertTrue(self.client.get(reverse('book-listing'), {'genre': 'Fantasy'}).streaming)
+        self.assertFalse(self.client.get(reverse('book-listing'), {'genre': 'Fantasy', 'sort': 'price'}).streaming)
+        self.assertFalse(self.client.get(reverse('book-listing'), {'genre': 'Fantasy', 'page': 2}).streaming)
+        self.assertFalse(self.client.get(reverse('author'), {'fields': 'name'}).streaming)
+
+    def test_change_invalidates_and_rebuilds_only_affected_shards(self):
+        horror = self.client.get(reverse('book-listing'), {'genre': 'Horror'})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.name = 'Royal Assassin'
+            self.book.save()
+        response = self.client.get(reverse('book-listing'), {'genre': 'Fantasy'})
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.data['results'][0]['name'], 'Royal Assassin')
+        self.assertEqual(snapshots.build(), (1, 0))
+        self.assertEqual(self.client.get(reverse('book-listing'), {'genre': 'Horror'})['ETag'], horror)
+
+    def test_unchanged_content_keeps_file_and_etag(self):
+        etag = self.client.get(reverse('book-listing'), {'genre': 'Fantasy'})['ETag']
+        inventory.reserve([(self.book.pk, 1)])
+        self.assertEqual(snapshots.build(), (0, 0))
+        self.assertEqual(self.client.get(reverse('book-listing'), {'genre': 'Fantasy'})['ETag'], etag)
+
+
+class AdminScalingTests(TestCase):
+    def setUp(self):
+        Author.objects.bulk_create(Author(name=f'Author {i:02}') for i in range(10))
+
+    def test_pages_past_capped_count_stay_reachable(self):
+        paginator = EstimatedCountPaginator(Author.objects.order_by('pk'), 2)
+        paginator.max_count = 3
+        self.assertEqual(paginator.count, 3)
+        page = paginator.page(4)
+        self.assertEqual([author.name for author in page], ['Author 06', 'Author 07'])
+        self.assertTrue(page.has_next())
+        self.assertFalse(paginator.page(5).has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(6)
+
+    def test_name_search_is_an_index_range(self):
+        Author.objects.create(name='tolstoy')
+        Author.objects.create(name='Tolkien')
+        model_admin = admin.site._registry[Author]
+        results, _ = model_admin.get_search_results(None, Author.objects.order_by('name'), 'tol')
+        self.assertEqual([author.name for author in results], ['Tolkien', 'tolstoy'])
+        results, _ = model_admin.get_search_results(None, Author.objects.all(), 'Tol')
+        self.assertEqual([author.name for author in results], ['Tolkien'])
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('SCAN main_author', results.explain())
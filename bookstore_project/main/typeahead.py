@@ -0,0 +1,243 @@
+"""In-process prefix index for search-as-you-type over book, author and
+publisher names.
+
+Every name is indexed under each of its word suffixes ("j r r tolkien",
+"r r tolkien", "tolkien", ...) in one sorted list, so a query is a binary
+search plus a scan of the matching slice. The index is loaded from the
+database on first use and then kept current by the model signals in
+``main.signals``; answering a query never touches the database. Each
+process holds its own copy, which is rebuilt once it is older than
+``TYPEAHEAD_MAX_AGE`` so changes that bypass signals (bulk loads, other
+processes' sales) cannot leave it drifting indefinitely.
+
+Only the very first build runs in a request. Later rebuilds are started by
+the first query that finds the index too old and run on a background thread,
+while queries keep being answered from the old copy. The new copy is loaded
+without holding the index lock and swapped in under it; signal updates that
+arrive while it loads are replayed onto it, so the swap does not undo them.
+Sales are not replayed, since the new copy may already count them.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Q, Sum
+
+from main.models import Author, Book, Publisher, Reservation
+
+BOOK = 'book'
+AUTHOR = 'author'
+PUBLISHER = 'publisher'
+
+MAX_CACHED_QUERIES = 4096
+
+_separators = re.compile(r'[\W_]+')
+
+
+def max_age():
+    return getattr(settings, 'TYPEAHEAD_MAX_AGE', timedelta(minutes=15))
+
+
+def normalize(text):
+    return _separators.sub(' ', text.casefold()).strip()
+
+
+def terms(name):
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+@dataclass
+class Entry:
+    kind: str
+    pk: int
+    name: str
+    popularity: int
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self._book_refs = {}
+        self._cache = {}
+        self._build_lock = threading.Lock()
+        self._journal = None
+        self._refreshing = False
+        self.is_built = False
+        self.built_at = None
+
+    def _record(self, method, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def build(self):
+        with self._lock:
+            self._journal = []
+        try:
+            keys, entries, book_refs = self._load()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._keys, self._entries, self._book_refs = keys, entries, book_refs
+            self._cache.clear()
+            for method, args in journal:
+                getattr(self, method)(*args)
+            self.is_built = True
+            self.built_at = time.monotonic()
+
+    def _load(self):
+        authors = Author.objects.annotate(popularity=Count('book')).values_list('pk', 'name', 'popularity')
+        publishers = Publisher.objects.annotate(popularity=Count('book')).values_list('pk', 'name', 'popularity')
+        books = Book.objects.annotate(
+            popularity=Sum('reservationitem__quantity', filter=Q(reservationitem__reservation__status=Reservation.CONFIRMED)),
+        ).values_list('pk', 'name', 'popularity', 'author_id', 'publisher_id')
+
+        entries, book_refs = {}, {}
+        for kind, rows in ((AUTHOR, authors), (PUBLISHER, publishers)):
+            for pk, name, popularity in rows:
+                entries[kind, pk] = Entry(kind, pk, name, popularity)
+        for pk, name, popularity, author_id, publisher_id in books:
+            entries[BOOK, pk] = Entry(BOOK, pk, name, popularity or 0)
+            book_refs[pk] = (author_id, publisher_id)
+        keys = sorted(
+            (term, entry.kind, entry.pk)
+            for entry in entries.values()
+            for term in terms(entry.name)
+        )
+        return keys, entries, book_refs
+
+    def is_stale(self):
+        return not self.is_built or time.monotonic() - self.built_at > max_age().total_seconds()
+
+    def ensure_built(self):
+        if not self.is_built:
+            with self._build_lock:
+                if not self.is_built:
+                    self.build()
+        elif self.is_stale():
+            self.refresh_in_background()
+
+    def refresh_in_background(self):
+        """Start rebuilding on a separate thread unless a rebuild is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='typeahead-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self._build_lock:
+                if self.is_stale():
+                    self.build()
+        finally:
+            self._refreshing = False
+            connections.close_all()
+
+    def search(self, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            cached = self._cache.get((prefix, limit))
+            if cached is not None:
+                return cached
+            matches = {}
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                _, kind, pk = self._keys[i]
+                matches[kind, pk] = self._entries[kind, pk]
+                i += 1
+            results = [
+                {'type': entry.kind, 'id': entry.pk, 'name': entry.name}
+                for entry in heapq.nsmallest(limit, matches.values(), key=lambda e: (-e.popularity, e.name))
+            ]
+            if len(self._cache) >= MAX_CACHED_QUERIES:
+                self._cache.clear()
+            self._cache[prefix, limit] = results
+            return results
+
+    def _invalidate(self, *names):
+        """Drop cached results for every query that could match one of ``names``."""
+        changed = [term for name in names for term in terms(name)]
+        stale = [key for key in self._cache if any(term.startswith(key[0]) for term in changed)]
+        for key in stale:
+            del self._cache[key]
+
+    def _remove_entry(self, kind, pk):
+        entry = self._entries.pop((kind, pk), None)
+        if entry is None:
+            return None
+        for term in terms(entry.name):
+            i = bisect_left(self._keys, (term, kind, pk))
+            if i < len(self._keys) and self._keys[i] == (term, kind, pk):
+                del self._keys[i]
+        return entry
+
+    def _add_entry(self, entry):
+        self._entries[entry.kind, entry.pk] = entry
+        for term in terms(entry.name):
+            insort(self._keys, (term, entry.kind, entry.pk))
+
+    def _adjust_popularity(self, kind, pk, delta):
+        entry = self._entries.get((kind, pk))
+        if entry is not None:
+            entry.popularity += delta
+            self._invalidate(entry.name)
+
+    def record_sales(self, items):
+        """Raise the popularity of books by the ``(book_id, quantity)`` pairs just sold."""
+        with self._lock:
+            for pk, quantity in items:
+                self._adjust_popularity(BOOK, pk, quantity)
+
+    def upsert(self, kind, pk, name):
+        with self._lock:
+            self._record('upsert', kind, pk, name)
+            old = self._remove_entry(kind, pk)
+            self._add_entry(Entry(kind, pk, name, old.popularity if old else 0))
+            self._invalidate(name, *([old.name] if old else []))
+
+    def upsert_book(self, pk, name, author_id, publisher_id):
+        with self._lock:
+            self._record('upsert_book', pk, name, author_id, publisher_id)
+            old_refs = self._book_refs.get(pk)
+            if old_refs != (author_id, publisher_id):
+                if old_refs is not None:
+                    self._adjust_popularity(AUTHOR, old_refs[0], -1)
+                    self._adjust_popularity(PUBLISHER, old_refs[1], -1)
+                self._adjust_popularity(AUTHOR, author_id, 1)
+                self._adjust_popularity(PUBLISHER, publisher_id, 1)
+                self._book_refs[pk] = (author_id, publisher_id)
+            self.upsert(BOOK, pk, name)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._record('remove', kind, pk)
+            old = self._remove_entry(kind, pk)
+            if old is not None:
+                self._invalidate(old.name)
+            if kind == BOOK:
+                refs = self._book_refs.pop(pk, None)
+                if refs is not None:
+                    self._adjust_popularity(AUTHOR, refs[0], -1)
+                    self._adjust_popularity(PUBLISHER, refs[1], -1)
+            elif kind == PUBLISHER:
+                # Books of a deleted publisher are set to NULL without signals.
+                for book_pk, (author_id, publisher_id) in self._book_refs.items():
+                    if publisher_id == pk:
+                        self._book_refs[book_pk] = (author_id, None)
+
+
+index = PrefixIndex()
@@ -6,4 +6,12 @@ urlpatterns = [
     path('publisher/', views.PublisherView.as_view(), name='publisher'),
     path('genre/', views.GenreView.as_view(), name='genre'),
     path('book/', views.BookView.as_view(), name='book'),
+    path('book/listing/', views.BookListingView.as_view(), name='book-listing'),
+    path('book/reprice/', views.RepriceView.as_view(), name='book-reprice'),
+    path('book/<int:pk>/similar/', views.SimilarBooksView.as_view(), name='book-similar'),
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    path('typeahead/', views.TypeaheadView.as_view(), name='typeahead'),
+    path('reservations/', views.ReservationView.as_view(), name='reservations'),
+    path('reservations/<int:pk>/', views.ReservationDetailView.as_view(), name='reservation-detail'),
+    path('reservations/<int:pk>/confirm/', views.ReservationConfirmView.as_view(), name='reservation-confirm'),
 ]
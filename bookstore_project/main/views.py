@@ -1,28 +1,397 @@
+import hashlib
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from main.models import Author, Publisher, Genre, Book
-from main.serializers import BookSerializer, AuthorSerializer, PublisherSerializer, GenreSerializer
+from rest_framework.settings import api_settings
+from authentication.permissions import IsAdminUser, IsOwnerOrAdmin
+from main import inventory, listings, pricing, snapshots, sync, typeahead
+from main.lookups import prefix_range
+from main.renderers import CATALOG_RENDERER_CLASSES
+from main.models import Author, Publisher, Genre, Book, BookListing, BookNeighbor, Reservation
+from main.serializers import (
+    BookSerializer, AuthorSerializer, PublisherSerializer, GenreSerializer, BookListingSerializer,
+    RepriceSerializer, ReservationSerializer,
+)
+
+MAX_BATCH_SIZE = 100
+MAX_ID = 2**63 - 1
+
+class InvalidQueryShape(ValueError):
+    pass
+
+def parse_ids(value):
+    """Parse a comma-separated id list, dropping duplicates but keeping order."""
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in value.split(',') if pk))
+    except ValueError:
+        raise InvalidQueryShape("ids must be a comma-separated list of integers")
+    if any(not 0 < pk <= MAX_ID for pk in ids):
+        raise InvalidQueryShape(f"ids must be between 1 and {MAX_ID}")
+    if len(ids) > MAX_BATCH_SIZE:
+        raise InvalidQueryShape(f"At most {MAX_BATCH_SIZE} ids can be requested at once")
+    return ids
+
+def fetch_batch(queryset, ids):
+    """Objects with the given ids in request order, from a single ``in_bulk`` query."""
+    found = queryset.in_bulk(ids) if ids else {}
+    return [found[pk] for pk in ids if pk in found]
+
+def serve_snapshot(view, request, shard):
+    """The pre-rendered file for ``shard`` if ``view`` may serve one for this request."""
+    if not view.serve_snapshots or shard is None or request.accepted_renderer.format != 'json':
+        return None
+    return snapshots.serve(request, shard)
+
+def serializer_context(request):
+    # Lets compact renderers receive Decimal prices instead of strings.
+    return {
+        'coerce_decimal_to_string': getattr(request.accepted_renderer, 'coerce_decimal_to_string', None),
+    }
+
+class CatalogListView(APIView):
+    """Full list of a catalog model, with conditional GET and ``?since=`` delta sync.
+
+    ``?fields=`` trims the payload and ``?expand=`` inlines related objects;
+    the queryset is narrowed to match so expansion costs no extra queries.
+    ``?ids=1,2,3`` restricts the list to a batch of at most ``MAX_BATCH_SIZE`` rows.
+    Besides JSON, lists can be negotiated as columnar JSON or MessagePack.
+    A plain JSON request for the whole list is answered from its snapshot
+    file when ``main.snapshots`` has one.
+    """
+    model = None
+    serializer_class = None
+    snapshot_shard = None
+    serve_snapshots = True
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *CATALOG_RENDERER_CLASSES]
+
+    def get_query_shape(self, request):
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        expand = list(dict.fromkeys(name for name in expand.split(',') if name)) if expand else []
+        unknown = [name for name in expand if name not in self.serializer_class.expandable_fields]
+        if unknown:
+            raise InvalidQueryShape(f"Unknown expansion(s): {', '.join(unknown)}")
+        if fields is None:
+            return None, expand
+        fields = list(dict.fromkeys(name for name in fields.split(',') if name))
+        available = self.serializer_class().fields
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise InvalidQueryShape(f"Unknown field(s): {', '.join(unknown)}")
+        return fields, expand
+
+    def get_queryset(self, fields=None, expand=()):
+        queryset = self.model.objects.all()
+        if expand:
+            queryset = queryset.select_related(*expand)
+        if fields is not None:
+            concrete = {field.name for field in self.model._meta.concrete_fields}
+            selected = set(fields) | set(expand)
+            if selected <= concrete:
+                columns = [self.model._meta.pk.name, *selected]
+                for name in expand:
+                    related = self.model._meta.get_field(name).related_model
+                    columns += [f'{name}__{field.name}' for field in related._meta.concrete_fields]
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, instance, fields=None, expand=()):
+        context = serializer_context(self.request)
+        return self.serializer_class(instance, many=True, fields=fields, expand=expand, context=context)
+
+    def get_versioned_models(self, expand=()):
+        return [self.model, *(self.model._meta.get_field(name).related_model for name in expand)]
+
+    def get_etag(self, request, expand=()):
+        # Built from commit-ordered counters, not updated_at, which is stamped
+        # at write time and can lag a transaction that commits later.
+        key = (
+            f"{self.model._meta.label}:{sync.versions(*self.get_versioned_models(expand))}:"
+            f"{request.accepted_media_type}:{request.get_full_path()}"
+        )
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ('Accept',))
+        return response
 
-class AuthorView(APIView):
     def get(self, request):
-        authors = Author.objects.all()
-        serializer = AuthorSerializer(authors, many=True)
-        return Response(serializer.data)
+        snapshot = serve_snapshot(self, request, None if request.query_params else self.snapshot_shard)
+        if snapshot is not None:
+            return snapshot
+        try:
+            fields, expand = self.get_query_shape(request)
+            ids = request.query_params.get('ids')
+            ids = parse_ids(ids) if ids is not None else None
+        except InvalidQueryShape as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset(fields, expand)
+        since = request.query_params.get('since')
+        if since is not None:
+            if ids is not None:
+                queryset = queryset.filter(pk__in=ids)
+            return self.get_delta(request, since, queryset, fields, expand)
+
+        etag = self.get_etag(request, expand)
+        modified = sync.last_modified(*self.get_versioned_models(expand))
+        modified_ts = int(modified.timestamp()) if modified else None
+        # Last-Modified is informational; only the ETag decides a 304.
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        sync_token = sync.issue_token()
+        instances = queryset if ids is None else fetch_batch(queryset, ids)
+        serializer = self.get_serializer(instances, fields, expand)
+        response = Response(serializer.data)
+        response['ETag'] = etag
+        if modified_ts is not None:
+            response['Last-Modified'] = http_date(modified_ts)
+        response['X-Sync-Token'] = sync_token
+        return response
+
+    def get_delta(self, request, token, queryset, fields=None, expand=()):
+        try:
+            since = sync.decode_token(token)
+        except sync.ExpiredSyncToken:
+            return Response({'error': 'Sync token expired, perform a full resync'}, status=status.HTTP_410_GONE)
+        except sync.InvalidSyncToken:
+            return Response({'error': 'Invalid sync token'}, status=status.HTTP_400_BAD_REQUEST)
+
+        sync_token = sync.issue_token()
+        changed, deleted = sync.changes_since(queryset, since, related=expand)
+        serializer = self.get_serializer(changed, fields, expand)
+        return Response({
+            'results': serializer.data,
+            'deleted': deleted,
+            'sync_token': sync_token,
+        })
+
+class AuthorView(CatalogListView):
+    model = Author
+    serializer_class = AuthorSerializer
+    snapshot_shard = 'author'
+
+class BookView(CatalogListView):
+    model = Book
+    serializer_class = BookSerializer
+
+class PublisherView(CatalogListView):
+    model = Publisher
+    serializer_class = PublisherSerializer
+    snapshot_shard = 'publisher'
+
+class GenreView(CatalogListView):
+    model = Genre
+    serializer_class = GenreSerializer
+    snapshot_shard = 'genre'
+
+class BookListingView(APIView):
+    """Filtered, sorted and paginated book listings read from ``BookListing`` alone.
+
+    The first pages of each genre in the default order come from snapshot files.
+    """
+    renderer_classes = CatalogListView.renderer_classes
+    serve_snapshots = True
+    sort_orders = {
+        'name': ('name', 'book'),
+        '-name': ('-name', '-book'),
+        'price': ('price', 'book'),
+        '-price': ('-price', '-book'),
+    }
+    default_page_size = 50
+    max_page_size = 100
+    # Deep OFFSETs read every skipped row; clients page further by narrowing filters.
+    max_page = 1000
+
+    def get_filters(self, params):
+        filters = Q()
+        if params.get('genre'):
+            filters &= Q(genre=params['genre'])
+        if params.get('title'):
+            filters &= prefix_range('name_key', listings.name_key(params['title']))
+        for param, lookup in (('author', 'author_id'), ('publisher', 'publisher_id')):
+            if params.get(param):
+                pk = int(params[param])
+                if not 0 < pk <= MAX_ID:
+                    raise ValueError(f"{param} is out of range")
+                filters &= Q(**{lookup: pk})
+        for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+            if params.get(param):
+                price = Decimal(params[param])
+                if not price.is_finite():
+                    raise ValueError(f"{param} must be a finite number")
+                filters &= Q(**{lookup: price})
+        return filters
 
-class BookView(APIView):
     def get(self, request):
-        books = Book.objects.all()
+        params = request.query_params
+        snapshot = serve_snapshot(self, request, snapshots.listing_shard_for(params))
+        if snapshot is not None:
+            return snapshot
+        ordering = self.sort_orders.get(params.get('sort', 'name'))
+        if ordering is None:
+            return Response({'error': f"sort must be one of {', '.join(self.sort_orders)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = self.get_filters(params)
+            page = int(params.get('page', 1))
+            page_size = min(int(params.get('page_size', self.default_page_size)), self.max_page_size)
+        except (ValueError, ArithmeticError):
+            return Response({'error': 'Invalid filter or page value'}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or page_size < 1:
+            return Response({'error': 'page and page_size must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        if page > self.max_page:
+            return Response({'error': f"page must be at most {self.max_page}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        offset = (page - 1) * page_size
+        rows = list(BookListing.objects.filter(filters).order_by(*ordering)[offset:offset + page_size + 1])
+        serializer = BookListingSerializer(rows[:page_size], many=True, context=serializer_context(request))
+        return Response({
+            'page': page,
+            'has_next': len(rows) > page_size,
+            'results': serializer.data,
+        })
+
+class SimilarBooksView(APIView):
+    def get(self, request, pk):
+        if pk > MAX_ID:
+            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
+        neighbors = BookNeighbor.objects.filter(book_id=pk).select_related('neighbor').order_by('rank')
+        books = [neighbor.neighbor for neighbor in neighbors]
+        if not books and not Book.objects.filter(pk=pk).exists():
+            return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
         serializer = BookSerializer(books, many=True)
         return Response(serializer.data)
 
-class PublisherView(APIView):
+class RepriceView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = RepriceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        try:
+            if 'prices' in data:
+                batch = pricing.reprice_by_map(data['prices'], reason=data['reason'])
+            else:
+                batch = pricing.reprice_by_rule(reason=data['reason'], **data['rule'])
+        except pricing.RepricingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'batch': batch.pk, 'changed': batch.changed_count}, status=status.HTTP_200_OK)
+
+class ReservationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ReservationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = [(item['book_id'], item['quantity']) for item in serializer.validated_data['items']]
+        try:
+            reservation = inventory.reserve(items, user=request.user)
+        except inventory.UnknownBook as e:
+            return Response({'error': 'Unknown book', 'book': e.book_id}, status=status.HTTP_400_BAD_REQUEST)
+        except inventory.OutOfStock as e:
+            return Response({'error': 'Out of stock', 'book': e.book_id}, status=status.HTTP_409_CONFLICT)
+
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+class OwnedReservationMixin:
+    """Reservations can only be seen, released or confirmed by their owner or staff."""
+    permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
+
+    def get_reservation(self, pk, queryset=None):
+        reservation = (queryset if queryset is not None else Reservation.objects).filter(pk=pk).first()
+        if reservation is not None:
+            self.check_object_permissions(self.request, reservation)
+        return reservation
+
+class ReservationDetailView(OwnedReservationMixin, APIView):
+    def get(self, request, pk):
+        reservation = self.get_reservation(pk, Reservation.objects.prefetch_related('items'))
+        if reservation is None:
+            return Response({'error': 'Reservation not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ReservationSerializer(reservation).data)
+
+    def delete(self, request, pk):
+        if self.get_reservation(pk) is None or not inventory.release(pk):
+            return Response({'error': 'Reservation is not active'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ReservationConfirmView(OwnedReservationMixin, APIView):
+    def post(self, request, pk):
+        if self.get_reservation(pk) is None:
+            return Response({'error': 'Reservation not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not inventory.confirm(pk):
+            return Response({'error': 'Reservation is not active'}, status=status.HTTP_409_CONFLICT)
+        return Response({'id': pk, 'status': Reservation.CONFIRMED})
+
+class TypeaheadView(APIView):
+    """Name suggestions from the in-process prefix index; no database access
+    once the index is loaded, so authentication is skipped as well."""
+    authentication_classes = []
+    permission_classes = []
+    max_limit = 50
+
     def get(self, request):
-        publishers = Publisher.objects.all()
-        serializer = PublisherSerializer(publishers, many=True)
-        return Response(serializer.data)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        typeahead.index.ensure_built()
+        return Response(typeahead.index.search(request.query_params.get('q', ''), limit=max(limit, 1)))
+
+class BatchView(APIView):
+    """Books, authors and publishers by id in one round trip.
+
+    ``?books=``, ``?authors=`` and ``?publishers=`` take comma-separated ids.
+    The authors and publishers of the requested books are included, so a
+    cart can be rendered from one response with one query per model.
+    """
+    renderer_classes = CatalogListView.renderer_classes
+    columnar_keys = ('books', 'authors', 'publishers')
 
-class GenreView(APIView):
     def get(self, request):
-        genres = Genre.objects.all()
-        serializer = GenreSerializer(genres, many=True)
-        return Response(serializer.data)
+        try:
+            requested = {
+                name: parse_ids(request.query_params.get(name, ''))
+                for name in ('books', 'authors', 'publishers')
+            }
+        except InvalidQueryShape as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        books = fetch_batch(Book.objects.all(), requested['books'])
+        author_ids = list(dict.fromkeys([*requested['authors'], *(book.author_id for book in books)]))
+        publisher_ids = list(dict.fromkeys([
+            *requested['publishers'], *(book.publisher_id for book in books if book.publisher_id is not None),
+        ]))
+        authors = fetch_batch(Author.objects.all(), author_ids)
+        publishers = fetch_batch(Publisher.objects.all(), publisher_ids)
+
+        found = {
+            'books': {book.pk for book in books},
+            'authors': {author.pk for author in authors},
+            'publishers': {publisher.pk for publisher in publishers},
+        }
+        context = serializer_context(request)
+        return Response({
+            'books': BookSerializer(books, many=True, context=context).data,
+            'authors': AuthorSerializer(authors, many=True, context=context).data,
+            'publishers': PublisherSerializer(publishers, many=True, context=context).data,
+            'missing': {
+                name: [pk for pk in ids if pk not in found[name]]
+                for name, ids in requested.items()
+            },
+        })